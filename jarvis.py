@@ -33,7 +33,7 @@ from smart_assistant import (
 from smart_assistant.audit_logger import AuditLogger
 from smart_assistant.calendar_client import SCOPES
 from smart_assistant.config import get_config_value, load_config
-from smart_assistant.models import AssistantResult
+from smart_assistant.models import AssistantResult, CalendarEvent, TaskItem
 
 
 logging.basicConfig(
@@ -78,10 +78,12 @@ def bootstrap() -> None:
     retention_days = int(retention_days_raw) if retention_days_raw else 7
     log_http_raw = get_config_value(CONFIG, "assistant.log_http", "ASSISTANT_LOG_HTTP", False)
     log_http = str(log_http_raw).lower() in ("true", "1", "yes") if isinstance(log_http_raw, str) else bool(log_http_raw)
+    log_format = get_config_value(CONFIG, "assistant.log_format", "ASSISTANT_LOG_FORMAT", "jsonl")
     AUDIT_LOGGER = AuditLogger(
         log_dir=log_dir,
         retention_days=retention_days,
         log_http=log_http,
+        log_format=log_format,
     )
     logger.info("Audit logging initialized (retention: %d days, log_http: %s)", retention_days, log_http)
 
@@ -90,6 +92,8 @@ def bootstrap() -> None:
     openai_base_url = get_config_value(CONFIG, "openai.base_url", "OPENAI_BASE_URL")
     openai_text_model = get_config_value(CONFIG, "openai.text_model", "OPENAI_TEXT_MODEL", "gpt-4o-mini")
     openai_vision_model = get_config_value(CONFIG, "openai.vision_model", "OPENAI_VISION_MODEL")
+    openai_stream_raw = get_config_value(CONFIG, "openai.stream_responses", "OPENAI_STREAM_RESPONSES", False)
+    openai_stream = str(openai_stream_raw).lower() in ("true", "1", "yes") if isinstance(openai_stream_raw, str) else bool(openai_stream_raw)
     google_client_secrets_path = get_config_value(
         CONFIG, "google.client_secrets_path", "GOOGLE_CLIENT_SECRETS_PATH"
     )
@@ -175,6 +179,8 @@ def bootstrap() -> None:
         persona_text=persona_text,
         usage_path=usage_path,
         audit_logger=AUDIT_LOGGER,  # 传递审计日志器以记录 API 使用量
+        image_cache_dir=assistant_cfg.get("image_cache_dir"),
+        stream_responses=openai_stream,
     )
     PARSER = parser
     global ALLOWED_MODELS, CURRENT_MODEL, BASE_VISION_MODEL, CURRENT_VISION_MODEL, MODEL_STATE_PATH
@@ -284,6 +290,32 @@ def _save_today_cache(cache: Dict[str, str]) -> None:
     except Exception:
         pass
 
+async def _build_today_summary(date_key: str, start_local: datetime, end_local: datetime) -> str:
+    """并发拉取今日日程与待办，再生成摘要；阻塞的 Google/OpenAI 调用都放到线程池，避免卡住事件循环。"""
+    start_iso = start_local.astimezone(timezone.utc).isoformat()
+    end_iso = end_local.astimezone(timezone.utc).isoformat()
+
+    async def fetch_events():
+        try:
+            return await run_in_executor(ASSISTANT.calendar_client.list_events, start_iso, end_iso)
+        except Exception as exc:
+            logger.warning("Failed to list today's events: %s", exc)
+            return []
+
+    async def fetch_tasks():
+        if not ASSISTANT.task_client:
+            return []
+        try:
+            return await run_in_executor(ASSISTANT.task_client.list_tasks_for_date, date_key, DEFAULT_TIMEZONE)
+        except Exception as exc:
+            logger.warning("Failed to list today's tasks: %s", exc)
+            return []
+
+    events, tasks = await asyncio.gather(fetch_events(), fetch_tasks())
+    summary = await run_in_executor(PARSER.summarize_today, date_key, DEFAULT_TIMEZONE, events, tasks)
+    return summary or "今天暂无安排。"
+
+
 async def today_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not ASSISTANT or not PARSER:
         await update.message.reply_text("助手尚未初始化。")
@@ -305,22 +337,7 @@ async def today_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text(cache[date_key], reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("重新生成", callback_data="today_regen")]]))
         return
 
-    # Fetch events and tasks
-    try:
-        start_iso = start_local.astimezone(timezone.utc).isoformat()
-        end_iso = end_local.astimezone(timezone.utc).isoformat()
-        events = ASSISTANT.calendar_client.list_events(start_iso, end_iso)
-    except Exception as exc:
-        events = []
-        logger.warning("Failed to list today's events: %s", exc)
-    try:
-        tasks = ASSISTANT.task_client.list_tasks_for_date(date_key, DEFAULT_TIMEZONE) if ASSISTANT.task_client else []
-    except Exception as exc:
-        tasks = []
-        logger.warning("Failed to list today's tasks: %s", exc)
-
-    # Summarize
-    summary = PARSER.summarize_today(date_key, DEFAULT_TIMEZONE, events, tasks) or "今天暂无安排。"
+    summary = await _build_today_summary(date_key, start_local, end_local)
     cache[date_key] = summary
     _save_today_cache(cache)
     await update.message.reply_text(summary, reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("重新生成", callback_data="today_regen")]]))
@@ -342,17 +359,7 @@ async def today_regen_cb(update: Update, context: ContextTypes.DEFAULT_TYPE):
     end_local = start_local + timedelta(days=1)
     date_key = local_today.isoformat()
 
-    try:
-        start_iso = start_local.astimezone(timezone.utc).isoformat()
-        end_iso = end_local.astimezone(timezone.utc).isoformat()
-        events = ASSISTANT.calendar_client.list_events(start_iso, end_iso)
-    except Exception as exc:
-        events = []
-    try:
-        tasks = ASSISTANT.task_client.list_tasks_for_date(date_key, DEFAULT_TIMEZONE) if ASSISTANT.task_client else []
-    except Exception:
-        tasks = []
-    summary = PARSER.summarize_today(date_key, DEFAULT_TIMEZONE, events, tasks) or "今天暂无安排。"
+    summary = await _build_today_summary(date_key, start_local, end_local)
     cache = _load_today_cache()
     cache[date_key] = summary
     _save_today_cache(cache)
@@ -687,30 +694,12 @@ async def send_email_notification(result: AssistantResult, email_subject: str) -
         message_parts.append(result.message)
         
         if result.events:
-            event_blocks = []
-            for idx, event in enumerate(result.events, start=1):
-                block_lines = [event.to_human_readable()]
-                if idx - 1 < len(result.calendar_links):
-                    link = result.calendar_links[idx - 1]
-                    if link:
-                        block_lines.append(f"链接: {link}")
-                event_blocks.append("\n".join(block_lines))
-            if event_blocks:
-                message_parts.append("")
-                message_parts.append("\n\n".join(event_blocks))
+            message_parts.append("")
+            message_parts.append(CalendarEvent.render_many(result.events, result.calendar_links))
         
         if result.tasks:
-            task_blocks = []
-            for idx, task in enumerate(result.tasks, start=1):
-                block_lines = [f"{idx}. {task.to_human_readable()}"]
-                if idx - 1 < len(result.task_links):
-                    link = result.task_links[idx - 1]
-                    if link:
-                        block_lines.append(f"链接: {link}")
-                task_blocks.append("\n".join(block_lines))
-            if task_blocks:
-                message_parts.append("")
-                message_parts.append("✅ 待办事项:\n" + "\n\n".join(task_blocks))
+            message_parts.append("")
+            message_parts.append("✅ 待办事项:\n" + TaskItem.render_many(result.tasks, result.task_links))
         
         message = "\n".join(message_parts)
         
@@ -753,28 +742,10 @@ async def send_email_notification(result: AssistantResult, email_subject: str) -
 async def reply_with_result(update: Update, result: AssistantResult):
     blocks = []
     if result.success and result.events:
-        event_blocks = []
-        for idx, event in enumerate(result.events, start=1):
-            block_lines = [event.to_human_readable()]
-            if idx - 1 < len(result.calendar_links):
-                link = result.calendar_links[idx - 1]
-                if link:
-                    block_lines.append(f"链接: {link}")
-            event_blocks.append("\n".join(block_lines))
-        if event_blocks:
-            blocks.append("\n\n".join(event_blocks))
+        blocks.append(CalendarEvent.render_many(result.events, result.calendar_links))
 
     if result.success and result.tasks:
-        task_blocks = []
-        for idx, task in enumerate(result.tasks, start=1):
-            block_lines = [f"{idx}. {task.to_human_readable()}"]
-            if idx - 1 < len(result.task_links):
-                link = result.task_links[idx - 1]
-                if link:
-                    block_lines.append(f"链接: {link}")
-            task_blocks.append("\n".join(block_lines))
-        if task_blocks:
-            blocks.append("✅ 待办事项:\n" + "\n\n".join(task_blocks))
+        blocks.append("✅ 待办事项:\n" + TaskItem.render_many(result.tasks, result.task_links))
 
     if blocks:
         message = f"{result.message}\n\n" + "\n\n".join(blocks)
@@ -1176,7 +1147,12 @@ def main():
         except Exception:
             pass
     
-    application.run_polling(drop_pending_updates=True, close_loop=False)
+    try:
+        application.run_polling(drop_pending_updates=True, close_loop=False)
+    finally:
+        # 退出前把尚未 fsync 的审计日志落盘并关闭缓存的 fd
+        if AUDIT_LOGGER:
+            AUDIT_LOGGER.close()
 
 
 def _current_time_strings() -> Tuple[str, str]:
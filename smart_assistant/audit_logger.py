@@ -8,12 +8,35 @@ from __future__ import annotations
 import json
 import logging
 import os
+import re
+import struct
+import threading
+import time
+from collections import deque
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+try:
+    import msgpack
+except ImportError:  # 可选依赖，仅在 log_format="msgpack" 时需要
+    msgpack = None
 
 logger = logging.getLogger(__name__)
 
+# 过期日志清理的最小间隔（秒）
+CLEANUP_INTERVAL_SECONDS = 3600
+
+# 需要脱敏的字段名（子串匹配，忽略大小写）
+_SENSITIVE_KEY_RE = re.compile(r"api_key|token|password|secret|credentials", re.IGNORECASE)
+
+# 日志格式 -> 文件扩展名
+LOG_FORMAT_EXTENSIONS = {"jsonl": ".jsonl", "msgpack": ".mpk"}
+# 不需要 fsync 的日志类型（丢失少量条目可接受，交给操作系统延迟回写）
+NON_DURABLE_LOG_TYPES = frozenset({"api_usage", "api_calls"})
+# msgpack 帧头：小端 4 字节长度
+_FRAME_HEADER = struct.Struct("<I")
+
 
 class AuditLogger:
     """审计日志记录器 - 保存用户交互和系统事件"""
@@ -23,6 +46,9 @@ class AuditLogger:
         log_dir: str = "logs",
         retention_days: int = 7,
         log_http: bool = False,
+        log_format: str = "jsonl",
+        fsync_interval_s: float = 5.0,
+        fsync_bytes: int = 256 * 1024,
     ):
         """
         初始化审计日志系统
@@ -31,55 +57,142 @@ class AuditLogger:
             log_dir: 日志目录
             retention_days: 日志保留天数（默认7天）
             log_http: 是否记录正常的HTTP请求（默认False，避免噪音）
+            log_format: 日志格式，"jsonl"（默认）或 "msgpack"（长度前缀的二进制帧，需要安装 msgpack）
+            fsync_interval_s: 距上次 fsync 超过该秒数时再次 fsync
+            fsync_bytes: 未 fsync 的字节数超过该值时立即 fsync
         """
         self.log_dir = Path(log_dir)
         self.log_dir.mkdir(exist_ok=True)
         self.retention_days = retention_days
         self.log_http = log_http
+        self.fsync_interval_s = fsync_interval_s
+        self.fsync_bytes = fsync_bytes
         self._logger = logging.getLogger(f"{__name__}.AuditLogger")
+        log_format = (log_format or "jsonl").lower()
+        if log_format not in LOG_FORMAT_EXTENSIONS:
+            self._logger.warning(f"Unknown audit log format '{log_format}', using jsonl")
+            log_format = "jsonl"
+        if log_format == "msgpack" and msgpack is None:
+            self._logger.warning("msgpack is not installed, falling back to jsonl audit logs")
+            log_format = "jsonl"
+        self.log_format = log_format
+        self._log_ext = LOG_FORMAT_EXTENSIONS[log_format]
+        # log_type -> (日期, fd)；按天复用追加写 fd，避免每条日志都 open/close
+        self._fds: Dict[str, Tuple[str, int]] = {}
+        # log_type -> [未 fsync 字节数, 上次 fsync 时间]
+        self._fsync_state: Dict[str, List[float]] = {}
+        self._fd_lock = threading.Lock()
+        self._cleanup_lock = threading.Lock()
+        self._last_cleanup_ts: Optional[float] = None
         
-        # 清理旧日志
-        self._cleanup_old_logs()
+        # 清理旧日志（后台线程执行，不阻塞启动）
+        self._schedule_cleanup()
     
     def _get_log_file_path(self, log_type: str, date: Optional[datetime] = None) -> Path:
         """获取日志文件路径"""
         if date is None:
             date = datetime.now()
         date_str = date.strftime("%Y-%m-%d")
-        filename = f"{log_type}_{date_str}.jsonl"
+        filename = f"{log_type}_{date_str}{self._log_ext}"
         return self.log_dir / filename
     
+    def _schedule_cleanup(self) -> None:
+        """在后台线程中清理旧日志，最多每小时一次"""
+        now = time.monotonic()
+        with self._cleanup_lock:
+            if self._last_cleanup_ts is not None and now - self._last_cleanup_ts < CLEANUP_INTERVAL_SECONDS:
+                return
+            self._last_cleanup_ts = now
+        threading.Thread(target=self._cleanup_old_logs, name="AuditLogCleanup", daemon=True).start()
+    
     def _cleanup_old_logs(self) -> None:
-        """清理超过保留期的日志文件"""
-        cutoff_date = datetime.now() - timedelta(days=self.retention_days)
+        """清理超过保留期的日志文件（按文件修改时间判断）"""
+        cutoff_ts = (datetime.now() - timedelta(days=self.retention_days)).timestamp()
         
-        for log_file in self.log_dir.glob("*.jsonl"):
-            try:
-                # 从文件名提取日期
-                parts = log_file.stem.split("_")
-                if len(parts) >= 2:
-                    date_str = parts[-1]  # 最后一部分是日期
-                    file_date = datetime.strptime(date_str, "%Y-%m-%d")
-                    if file_date < cutoff_date:
-                        log_file.unlink()
-                        self._logger.info(f"Deleted old log file: {log_file.name}")
-            except Exception as e:
-                self._logger.warning(f"Failed to check/delete log file {log_file.name}: {e}")
+        try:
+            with os.scandir(self.log_dir) as entries:
+                for entry in entries:
+                    if not entry.name.endswith((".jsonl", ".mpk")):
+                        continue
+                    try:
+                        if entry.is_file() and entry.stat().st_mtime < cutoff_ts:
+                            os.unlink(entry.path)
+                            self._logger.info(f"Deleted old log file: {entry.name}")
+                    except OSError as e:
+                        self._logger.warning(f"Failed to check/delete log file {entry.name}: {e}")
+        except OSError as e:
+            self._logger.warning(f"Failed to scan log directory {self.log_dir}: {e}")
     
     def _write_log(self, log_type: str, data: Dict[str, Any]) -> None:
         """写入日志到文件"""
+        self._schedule_cleanup()
         try:
-            log_file = self._get_log_file_path(log_type)
+            now = datetime.now()
             log_entry = {
-                "timestamp": datetime.now().isoformat(),
+                "timestamp": now.isoformat(),
                 **data,
             }
             
-            with open(log_file, "a", encoding="utf-8") as f:
-                f.write(json.dumps(log_entry, ensure_ascii=False) + "\n")
+            if self.log_format == "msgpack":
+                frame = msgpack.packb(log_entry, use_bin_type=True)
+                payload = _FRAME_HEADER.pack(len(frame)) + frame
+            else:
+                payload = (json.dumps(log_entry, ensure_ascii=False) + "\n").encode("utf-8")
+            
+            with self._fd_lock:
+                fd = self._get_fd(log_type, now)
+                view = memoryview(payload)
+                while view:
+                    written = os.write(fd, view)
+                    view = view[written:]
+                if log_type not in NON_DURABLE_LOG_TYPES:
+                    self._maybe_fsync(log_type, fd, len(payload))
         except Exception as e:
             self._logger.error(f"Failed to write audit log: {e}")
     
+    def _get_fd(self, log_type: str, now: datetime) -> int:
+        """返回当天日志文件的追加写 fd，跨天时关闭旧 fd（调用方需持有 _fd_lock）"""
+        date_str = now.strftime("%Y-%m-%d")
+        cached = self._fds.get(log_type)
+        if cached and cached[0] == date_str:
+            return cached[1]
+        if cached:
+            self._flush_pending(log_type, cached[1])
+            os.close(cached[1])
+            del self._fds[log_type]
+        log_file = self._get_log_file_path(log_type, now)
+        fd = os.open(log_file, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self._fds[log_type] = (date_str, fd)
+        return fd
+    
+    def _maybe_fsync(self, log_type: str, fd: int, nbytes: int) -> None:
+        """按字节数/时间间隔周期性 fsync（调用方需持有 _fd_lock）"""
+        now = time.monotonic()
+        state = self._fsync_state.setdefault(log_type, [0, now])
+        state[0] += nbytes
+        if state[0] >= self.fsync_bytes or now - state[1] >= self.fsync_interval_s:
+            os.fsync(fd)
+            state[0] = 0
+            state[1] = now
+    
+    def _flush_pending(self, log_type: str, fd: int) -> None:
+        """关闭 fd 前把尚未 fsync 的数据落盘（调用方需持有 _fd_lock）"""
+        state = self._fsync_state.pop(log_type, None)
+        if state and state[0]:
+            os.fsync(fd)
+    
+    def close(self) -> None:
+        """关闭所有缓存的日志文件 fd"""
+        with self._fd_lock:
+            for log_type, (_, fd) in self._fds.items():
+                try:
+                    self._flush_pending(log_type, fd)
+                    os.close(fd)
+                except OSError:
+                    pass
+            self._fds.clear()
+            self._fsync_state.clear()
+    
     def log_user_interaction(
         self,
         user_id: str,
@@ -208,8 +321,7 @@ class AuditLogger:
         
         if request_data:
             # 清理敏感信息
-            safe_request = self._sanitize_data(request_data)
-            data["request"] = safe_request
+            data["request"] = self._sanitize_data(request_data)
         
         if response_data:
             data["response"] = response_data
@@ -224,16 +336,21 @@ class AuditLogger:
     
     def _sanitize_data(self, data: Dict[str, Any]) -> Dict[str, Any]:
         """清理敏感信息（如API密钥）"""
-        sensitive_keys = {"api_key", "token", "password", "secret", "credentials"}
-        sanitized = {}
+        sanitized: Dict[str, Any] = {}
+        # 用显式栈代替递归，避免深层嵌套时的递归开销
+        stack = deque([(data, sanitized)])
         
-        for key, value in data.items():
-            if any(sensitive in key.lower() for sensitive in sensitive_keys):
-                sanitized[key] = "***REDACTED***"
-            elif isinstance(value, dict):
-                sanitized[key] = self._sanitize_data(value)
-            else:
-                sanitized[key] = value
+        while stack:
+            source, target = stack.pop()
+            for key, value in source.items():
+                if _SENSITIVE_KEY_RE.search(str(key)):
+                    target[key] = "***REDACTED***"
+                elif isinstance(value, dict):
+                    child: Dict[str, Any] = {}
+                    target[key] = child
+                    stack.append((value, child))
+                else:
+                    target[key] = value
         
         return sanitized
     
@@ -253,6 +370,10 @@ class AuditLogger:
             completion_tokens: completion tokens
             total_tokens: 总 tokens
         """
+        # 没有任何用量时不写日志
+        if not (prompt_tokens or completion_tokens or total_tokens):
+            return
+        
         data = {
             "type": "api_usage",
             "model": model,
@@ -263,6 +384,35 @@ class AuditLogger:
         
         self._write_log("api_usage", data)
     
+    def _iter_log_entries(self, log_file: Path) -> Iterator[Dict[str, Any]]:
+        """逐条读取日志文件，跳过损坏的条目"""
+        if self.log_format == "msgpack":
+            with open(log_file, "rb") as f:
+                while True:
+                    header = f.read(_FRAME_HEADER.size)
+                    if len(header) < _FRAME_HEADER.size:
+                        break
+                    (length,) = _FRAME_HEADER.unpack(header)
+                    frame = f.read(length)
+                    if len(frame) < length:
+                        # 写入中断留下的半帧，后面不再有完整数据
+                        break
+                    try:
+                        entry = msgpack.unpackb(frame, raw=False)
+                    except Exception:
+                        continue
+                    if isinstance(entry, dict):
+                        yield entry
+            return
+        with open(log_file, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line.strip())
+                except Exception:
+                    continue
+                if isinstance(entry, dict):
+                    yield entry
+    
     def query_logs(
         self,
         log_type: str,
@@ -294,17 +444,15 @@ class AuditLogger:
             log_file = self._get_log_file_path(log_type, current_date)
             if log_file.exists():
                 try:
-                    with open(log_file, "r", encoding="utf-8") as f:
-                        for line in f:
-                            if len(results) >= limit:
-                                break
-                            try:
-                                entry = json.loads(line.strip())
-                                entry_date = datetime.fromisoformat(entry["timestamp"])
-                                if start_date <= entry_date <= end_date:
-                                    results.append(entry)
-                            except Exception:
-                                continue
+                    for entry in self._iter_log_entries(log_file):
+                        if len(results) >= limit:
+                            break
+                        try:
+                            entry_date = datetime.fromisoformat(entry["timestamp"])
+                            if start_date <= entry_date <= end_date:
+                                results.append(entry)
+                        except Exception:
+                            continue
                 except Exception as e:
                     self._logger.warning(f"Failed to read log file {log_file}: {e}")
             
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
-from typing import Optional
+import re
+from typing import Dict, Optional
 
 VALID_COLOR_IDS = {str(i) for i in range(1, 12)}
 
@@ -65,6 +66,39 @@ _COLOR_NAME_TO_ID = {
 }
 
 
+# Strips everything except decimal digits (handles inputs like "#11" or "color_07")
+_NON_DIGITS = re.compile(r"\D+")
+
+
+def _build_lookup() -> Dict[str, str]:
+    """Flatten ids, zero-padded ids, names and their "色" variants into one table."""
+    lookup: Dict[str, str] = {}
+    for color_id in VALID_COLOR_IDS:
+        lookup[color_id] = color_id
+        lookup[color_id.zfill(2)] = color_id
+    for name, color_id in _COLOR_NAME_TO_ID.items():
+        lowered = name.lower()
+        # Common casings resolve on the first lookup without calling lower()
+        for form in (lowered, lowered.capitalize(), lowered.upper()):
+            lookup.setdefault(form, color_id)
+            lookup.setdefault(form + "色", color_id)
+    return lookup
+
+
+_LOOKUP = _build_lookup()
+
+
+def _digit_fallback(text: str) -> Optional[str]:
+    digits_only = _NON_DIGITS.sub("", text)
+    if not digits_only:
+        return None
+    try:
+        normalized_digits = str(int(digits_only))
+    except ValueError:
+        return None
+    return normalized_digits if normalized_digits in VALID_COLOR_IDS else None
+
+
 def normalize_color_hint(value: Optional[str]) -> Optional[str]:
     """Normalize user/model-provided color hints into a valid Google Calendar colorId."""
     if value is None:
@@ -72,28 +106,4 @@ def normalize_color_hint(value: Optional[str]) -> Optional[str]:
     text = str(value).strip()
     if not text:
         return None
-
-    # Direct numeric match
-    if text in VALID_COLOR_IDS:
-        return text
-
-    # Extract digits (handles inputs like "#11" or "color_07")
-    digits_only = "".join(ch for ch in text if ch.isdigit())
-    if digits_only:
-        try:
-            normalized_digits = str(int(digits_only))
-        except ValueError:
-            normalized_digits = ""
-        if normalized_digits in VALID_COLOR_IDS:
-            return normalized_digits
-
-    lowered = text.lower()
-    if lowered in _COLOR_NAME_TO_ID:
-        return _COLOR_NAME_TO_ID[lowered]
-
-    if lowered.endswith("色"):
-        base = lowered[:-1]
-        if base in _COLOR_NAME_TO_ID:
-            return _COLOR_NAME_TO_ID[base]
-
-    return None
+    return _LOOKUP.get(text) or _LOOKUP.get(text.lower()) or _digit_fallback(text)
@@ -1,21 +1,37 @@
 from __future__ import annotations
 
 import os
+from functools import lru_cache
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Optional, Tuple
 
 import yaml
 
+try:
+    _YAML_LOADER = yaml.CSafeLoader
+except AttributeError:  # PyYAML built without libyaml
+    _YAML_LOADER = yaml.SafeLoader
+
 
 def load_config(path: Optional[str] = None) -> Dict[str, Any]:
-    """Load YAML config file."""
+    """Load YAML config file. The result is cached per mtime; treat it as read-only."""
     resolved = _resolve_path(path)
-    if not resolved or not resolved.exists():
+    if not resolved:
+        return {}
+    try:
+        mtime_ns = resolved.stat().st_mtime_ns
+    except FileNotFoundError:
         return {}
-    with resolved.open("r", encoding="utf-8") as fh:
-        data = yaml.safe_load(fh) or {}
+    return _load_config_cached(str(resolved), mtime_ns)
+
+
+@lru_cache(maxsize=8)
+def _load_config_cached(path: str, mtime_ns: int) -> Dict[str, Any]:
+    """Parse the YAML file; keyed on mtime so edits invalidate the cache."""
+    with open(path, "r", encoding="utf-8") as fh:
+        data = yaml.load(fh, Loader=_YAML_LOADER) or {}
     if not isinstance(data, dict):
-        raise ValueError(f"配置文件 {resolved} 顶层需要是一个对象。")
+        raise ValueError(f"配置文件 {path} 顶层需要是一个对象。")
     return data
 
 
@@ -39,7 +55,7 @@ def get_config_value(
         env_value = os.getenv(env_var)
         if env_value is not None:
             return env_value
-    value = _deep_get(config, key_path.split("."))
+    value = _deep_get(config, _split_key(key_path))
     if value is None:
         return default
     if cast and value is not None:
@@ -50,7 +66,12 @@ def get_config_value(
     return value
 
 
-def _deep_get(data: Dict[str, Any], keys) -> Optional[Any]:
+@lru_cache(maxsize=256)
+def _split_key(key_path: str) -> Tuple[str, ...]:
+    return tuple(key_path.split("."))
+
+
+def _deep_get(data: Dict[str, Any], keys: Tuple[str, ...]) -> Optional[Any]:
     current: Any = data
     for key in keys:
         if not isinstance(current, dict):
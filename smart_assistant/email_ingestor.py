@@ -1,11 +1,32 @@
 import asyncio
+import base64
 import email
 import imaplib
 import logging
+import quopri
+import re
+import select
+import socket
+import ssl
 import threading
-from contextlib import closing
+import time
 from email.header import decode_header, make_header
-from typing import Callable, Optional
+from typing import Callable, Dict, List, Optional, Tuple
+
+# RFC 2177: servers may drop an IDLE connection after 30 minutes of inactivity
+IDLE_TIMEOUT = 29 * 60
+
+_SUMMARY_FETCH = "(BODY.PEEK[HEADER.FIELDS (SUBJECT FROM TO)] BODYSTRUCTURE)"
+_FETCH_PREFIX = re.compile(rb"^(\d+) \(")
+_HEADER_LITERAL = re.compile(rb"BODY\[HEADER\.FIELDS[^\]]*\]\s*\{\d+\}$", re.IGNORECASE)
+_BODYSTRUCTURE_TOKEN = re.compile(r'\(|\)|"(?:[^"\\]|\\.)*"|\{\d+\}|[^\s()"]+')
+
+# (section, charset, content-transfer-encoding) of a text/plain part
+TextPart = Tuple[str, str, str]
+
+
+class _BodyStructureError(ValueError):
+    """Raised when a BODYSTRUCTURE response cannot be interpreted."""
 
 
 class EmailEventIngestor:
@@ -33,13 +54,24 @@ class EmailEventIngestor:
         self.notification_callback = notification_callback  # 用于发送 Telegram 通知的回调
         self._main_loop = main_event_loop  # Telegram bot 的主事件循环
         self._thread: Optional[threading.Thread] = None
+        # 主循环不可用时，异步通知统一投递到这个常驻的后台事件循环
+        self._notif_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._notif_thread: Optional[threading.Thread] = None
         self._stop_event = threading.Event()
+        self._known_unseen: set = set()
+        # 跨轮次复用的 IMAP 连接，避免每次检查都重新 TLS 握手和登录
+        self._mailbox = None
+        self._wake_r: Optional[socket.socket] = None
+        self._wake_w: Optional[socket.socket] = None
         self.logger = logging.getLogger(self.__class__.__name__)
 
     def start(self):
         if self._thread and self._thread.is_alive():
             return
         self._stop_event.clear()
+        self._wake_r, self._wake_w = socket.socketpair()
+        if asyncio.iscoroutinefunction(self.notification_callback):
+            self._start_notification_loop()
         self._thread = threading.Thread(target=self._loop, daemon=True)
         self._thread.start()
         self.logger.info("Email ingestor started for %s", self.username)
@@ -48,75 +80,371 @@ class EmailEventIngestor:
         if not self._thread:
             return
         self._stop_event.set()
+        # 唤醒正在 IDLE 中 select 的线程
+        if self._wake_w is not None:
+            try:
+                self._wake_w.send(b"\0")
+            except OSError:
+                pass
         self._thread.join()
+        self._thread = None
+        for sock in (self._wake_r, self._wake_w):
+            if sock is not None:
+                sock.close()
+        self._wake_r = self._wake_w = None
+        self._stop_notification_loop()
+
+    def _start_notification_loop(self):
+        if self._notif_thread and self._notif_thread.is_alive():
+            return
+        self._notif_loop = asyncio.new_event_loop()
+        self._notif_thread = threading.Thread(target=self._notif_loop.run_forever, daemon=True)
+        self._notif_thread.start()
+
+    def _stop_notification_loop(self):
+        loop = self._notif_loop
+        if not loop:
+            return
+        loop.call_soon_threadsafe(loop.stop)
+        if self._notif_thread:
+            self._notif_thread.join()
+        loop.close()
+        self._notif_loop = None
+        self._notif_thread = None
 
     def _loop(self):
-        while not self._stop_event.is_set():
-            try:
-                self._check_inbox()
-            except Exception:
-                self.logger.exception("Email polling failed")
-            self._stop_event.wait(self.poll_interval)
+        try:
+            while not self._stop_event.is_set():
+                try:
+                    self._check_inbox()
+                except Exception:
+                    self.logger.exception("Email polling failed")
+                    self._drop_mailbox()
+                if self._stop_event.is_set():
+                    break
+                # 服务器支持 IDLE 时等待推送，否则按 poll_interval 轮询
+                try:
+                    if self._idle_until_new_mail():
+                        continue
+                except Exception as exc:
+                    self.logger.warning("IMAP IDLE failed, falling back to polling: %s", exc)
+                    self._drop_mailbox()
+                self._stop_event.wait(self.poll_interval)
+        finally:
+            self._drop_mailbox()
 
-    def _check_inbox(self):
-        with closing(self._connect()) as mailbox:
+    def _get_mailbox(self):
+        """Return the pooled IMAP connection, connecting and selecting the folder if needed."""
+        if self._mailbox is None:
+            mailbox = self._connect()
             mailbox.select(self.folder)
-            status, data = mailbox.search(None, "UNSEEN")
-            if status != "OK":
-                self.logger.warning("Failed to search inbox: %s", status)
-                return
+            self._mailbox = mailbox
+        return self._mailbox
+
+    def _drop_mailbox(self):
+        mailbox, self._mailbox = self._mailbox, None
+        if mailbox is None:
+            return
+        try:
+            mailbox.logout()
+        except Exception:
+            pass
+
+    def _idle_until_new_mail(self) -> bool:
+        """Block in IMAP IDLE until new mail arrives; return False if the server lacks IDLE."""
+        mailbox = self._get_mailbox()
+        if "IDLE" not in mailbox.capabilities:
+            return False
+        # 上次检查之后到进入 IDLE 之前到达的邮件不会再触发推送
+        status, data = mailbox.search(None, "UNSEEN")
+        if status == "OK" and {mid.decode() for mid in data[0].split()} - self._known_unseen:
+            return True
+        # imaplib 在 3.14 之前没有公开的 IDLE 接口；借用 _new_tag 才能让标签与其内部计数保持一致
+        tag = mailbox._new_tag()
+        mailbox.send(tag + b" IDLE\r\n")
+        if not mailbox.readline().startswith(b"+"):
+            return False
+        sock = mailbox.socket()
+        deadline = time.monotonic() + IDLE_TIMEOUT
+        try:
+            while not self._stop_event.is_set():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                # readline 走的是 imaplib 的缓冲文件，已缓冲的行 select 看不到，先检查缓冲区
+                if not self._has_buffered_input(mailbox, sock):
+                    readable, _, _ = select.select([sock, self._wake_r], [], [], remaining)
+                    if self._wake_r in readable or not readable:
+                        continue
+                line = mailbox.readline()
+                if not line:
+                    raise imaplib.IMAP4.abort("connection closed during IDLE")
+                if b"EXISTS" in line or b"RECENT" in line:
+                    break
+        finally:
+            mailbox.send(b"DONE\r\n")
+            while True:
+                line = mailbox.readline()
+                if not line or line.startswith(tag):
+                    break
+        return True
+
+    @staticmethod
+    def _has_buffered_input(mailbox, sock) -> bool:
+        """Return True if the IMAP reader (or the SSL layer) already holds unread bytes."""
+        timeout = sock.gettimeout()
+        sock.setblocking(False)
+        try:
+            # 非阻塞 peek 会先返回缓冲区内容，缓冲区为空时也会顺带取走 SSL 层已解密的数据
+            return bool(mailbox.file.peek(1))
+        except (BlockingIOError, ssl.SSLWantReadError):
+            return False
+        finally:
+            sock.settimeout(timeout)
+
+    def _check_inbox(self):
+        mailbox = self._get_mailbox()
+        status, data = mailbox.search(None, "UNSEEN")
+        if status != "OK":
+            self.logger.warning("Failed to search inbox: %s", status)
+            return
+
+        message_ids = [mid.decode() for mid in data[0].split()]
+        self._known_unseen = set(message_ids)
+        if not message_ids:
+            return
 
-            message_ids = data[0].split()
+        # 一次 FETCH 取回所有邮件的头部和 BODYSTRUCTURE（PEEK 不会标记已读）
+        summaries = self._fetch_summaries(mailbox, message_ids)
+        bodies = self._fetch_text_bodies(mailbox, summaries)
+
+        processed: List[str] = []
+        try:
             for message_id in message_ids:
-                status, msg_data = mailbox.fetch(message_id, "(RFC822)")
-                if status != "OK":
+                summary = summaries.get(message_id)
+                if summary is None:
+                    continue
+                headers = summary[0]
+                body = bodies.get(message_id)
+                if body is None:
+                    body = self._fetch_full_body(mailbox, message_id)
+                if body is None:
                     continue
-                raw_email = msg_data[0][1]
-                msg = email.message_from_bytes(raw_email)
-                subject = self._decode_header(msg.get("Subject", ""))
-                body = self._extract_body(msg)
-                context = {
-                    "source": "email",
-                    "email_subject": subject,
-                    "from": self._decode_header(msg.get("From", "")),
-                    "to": self._decode_header(msg.get("To", "")),
-                }
-                result = self.assistant.process_email_payload(subject, body, context)
-                if result.success and result.events:
-                    mailbox.store(message_id, "+FLAGS", "\\Seen")
-                    self.logger.info("Event created from email '%s' (%d events)", subject, len(result.events))
-                    
-                    # 发送 Telegram 通知
-                    if self.notification_callback:
+                processed.append(message_id)
+                self._handle_message(headers, body)
+        finally:
+            # RFC822 FETCH 过去会隐式标记已读；改用 PEEK 后统一在一次 STORE 中补上
+            if processed:
+                mailbox.store(",".join(processed), "+FLAGS", "\\Seen")
+
+    def _handle_message(self, headers, body: str):
+        subject = self._decode_header(headers.get("Subject", ""))
+        context = {
+            "source": "email",
+            "email_subject": subject,
+            "from": self._decode_header(headers.get("From", "")),
+            "to": self._decode_header(headers.get("To", "")),
+        }
+        result = self.assistant.process_email_payload(subject, body, context)
+        if result.success and result.events:
+            self.logger.info("Event created from email '%s' (%d events)", subject, len(result.events))
+            
+            # 发送 Telegram 通知
+            if self.notification_callback:
+                try:
+                    # 在后台线程中运行异步回调
+                    if asyncio.iscoroutinefunction(self.notification_callback):
+                        # 尝试获取主事件循环（Telegram bot 的事件循环）
                         try:
-                            # 在后台线程中运行异步回调
-                            if asyncio.iscoroutinefunction(self.notification_callback):
-                                # 尝试获取主事件循环（Telegram bot 的事件循环）
-                                try:
-                                    # 从线程本地存储获取主循环
-                                    main_loop = getattr(self, '_main_loop', None)
-                                    if main_loop and main_loop.is_running():
-                                        # 使用 run_coroutine_threadsafe 安全地调用
-                                        future = asyncio.run_coroutine_threadsafe(
-                                            self.notification_callback(result, subject),
-                                            main_loop
-                                        )
-                                        # 不等待结果，让它在后台执行
-                                    else:
-                                        # 如果没有主循环，创建一个新的事件循环
-                                        loop = asyncio.new_event_loop()
-                                        asyncio.set_event_loop(loop)
-                                        loop.run_until_complete(self.notification_callback(result, subject))
-                                        loop.close()
-                                except Exception as loop_exc:
-                                    self.logger.warning("Failed to get event loop for notification: %s", loop_exc)
-                            else:
-                                # 同步回调
-                                self.notification_callback(result, subject)
-                        except Exception as exc:
-                            self.logger.warning("Failed to send Telegram notification: %s", exc)
+                            # 从线程本地存储获取主循环
+                            main_loop = getattr(self, '_main_loop', None)
+                            if not (main_loop and main_loop.is_running()):
+                                # 如果没有主循环，使用常驻的后台事件循环
+                                self._start_notification_loop()
+                                main_loop = self._notif_loop
+                            # 使用 run_coroutine_threadsafe 安全地调用，不等待结果，让它在后台执行
+                            asyncio.run_coroutine_threadsafe(
+                                self.notification_callback(result, subject),
+                                main_loop
+                            )
+                        except Exception as loop_exc:
+                            self.logger.warning("Failed to get event loop for notification: %s", loop_exc)
+                    else:
+                        # 同步回调
+                        self.notification_callback(result, subject)
+                except Exception as exc:
+                    self.logger.warning("Failed to send Telegram notification: %s", exc)
+        else:
+            self.logger.info("Email '%s' did not contain an event.", subject)
+
+    def _fetch_summaries(self, mailbox, message_ids: List[str]) -> Dict[str, Tuple[object, Optional[TextPart], bool]]:
+        """Return message id -> (headers, body text part or None, whether BODYSTRUCTURE was usable)."""
+        status, data = mailbox.fetch(",".join(message_ids), _SUMMARY_FETCH)
+        if status != "OK":
+            self.logger.warning("Failed to fetch message summaries: %s", status)
+            return {}
+        summaries: Dict[str, Tuple[object, Optional[TextPart], bool]] = {}
+        current_id: Optional[str] = None
+        header_bytes: Optional[bytes] = None
+        meta = b""
+
+        def flush():
+            if current_id is None:
+                return
+            headers = email.message_from_bytes(header_bytes or b"")
+            try:
+                summaries[current_id] = (headers, self._find_text_part(meta), True)
+            except _BodyStructureError:
+                summaries[current_id] = (headers, None, False)
+
+        for item in data:
+            if isinstance(item, tuple):
+                match = _FETCH_PREFIX.match(item[0])
+                if match:
+                    flush()
+                    current_id = match.group(1).decode()
+                    header_bytes = None
+                    meta = b""
+                meta += item[0]
+                # 服务器可能先返回 BODYSTRUCTURE（其中也可能带 literal），按前缀识别头部 literal 而不是按位置
+                if _HEADER_LITERAL.search(item[0]):
+                    header_bytes = item[1] or b""
                 else:
-                    self.logger.info("Email '%s' did not contain an event.", subject)
+                    # 其余 literal 只可能来自 BODYSTRUCTURE，留给解析器报错回退
+                    meta += b"{0}"
+            elif isinstance(item, bytes):
+                match = _FETCH_PREFIX.match(item)
+                if match:
+                    flush()
+                    current_id = match.group(1).decode()
+                    header_bytes = None
+                    meta = b""
+                meta += item
+        flush()
+        return summaries
+
+    def _fetch_text_bodies(self, mailbox, summaries) -> Dict[str, str]:
+        """Fetch text/plain sections, one FETCH per distinct section number."""
+        by_section: Dict[str, List[str]] = {}
+        for message_id, (_, part, _) in summaries.items():
+            if part is not None:
+                by_section.setdefault(part[0], []).append(message_id)
+
+        bodies: Dict[str, str] = {}
+        for section, ids in by_section.items():
+            status, data = mailbox.fetch(",".join(ids), f"(BODY.PEEK[{section}])")
+            if status != "OK":
+                continue
+            for item in data:
+                if not isinstance(item, tuple):
+                    continue
+                match = _FETCH_PREFIX.match(item[0])
+                if not match:
+                    continue
+                message_id = match.group(1).decode()
+                part = summaries.get(message_id, (None, None, False))[1]
+                if part is None:
+                    continue
+                _, charset, encoding = part
+                bodies[message_id] = self._decode_part(item[1] or b"", charset, encoding)
+        # 没有 text/plain 部分的多部分邮件正文为空，与 _extract_body 的行为一致
+        for message_id, (_, part, parsed) in summaries.items():
+            if part is None and parsed:
+                bodies[message_id] = ""
+        return bodies
+
+    def _fetch_full_body(self, mailbox, message_id: str) -> Optional[str]:
+        """Fallback for messages whose BODYSTRUCTURE could not be used."""
+        status, msg_data = mailbox.fetch(message_id, "(BODY.PEEK[])")
+        if status != "OK" or not msg_data or not isinstance(msg_data[0], tuple):
+            return None
+        msg = email.message_from_bytes(msg_data[0][1])
+        return self._extract_body(msg)
+
+    def _find_text_part(self, meta: bytes) -> Optional[TextPart]:
+        """Locate the body part: a single-part text/* body, or the first non-attachment text/plain part."""
+        text = meta.decode("utf-8", errors="replace")
+        marker = text.find("BODYSTRUCTURE ")
+        if marker == -1:
+            raise _BodyStructureError("missing BODYSTRUCTURE")
+        tree = self._parse_bodystructure(text[marker + len("BODYSTRUCTURE "):])
+        if not isinstance(tree, list):
+            raise _BodyStructureError("malformed BODYSTRUCTURE")
+        return self._search_text_part(tree, "")
+
+    @staticmethod
+    def _parse_bodystructure(text: str):
+        stack: List[list] = [[]]
+        for token in _BODYSTRUCTURE_TOKEN.findall(text):
+            if token == "(":
+                stack.append([])
+            elif token == ")":
+                if len(stack) == 1:
+                    break
+                node = stack.pop()
+                stack[-1].append(node)
+                if len(stack) == 1:
+                    break
+            elif token.startswith("{"):
+                # 结构中含 literal 时放弃解析，走完整拉取的回退路径
+                raise _BodyStructureError("literal inside BODYSTRUCTURE")
+            elif token.startswith('"'):
+                stack[-1].append(re.sub(r"\\(.)", r"\1", token[1:-1]))
+            elif token.upper() == "NIL":
+                stack[-1].append(None)
+            else:
+                stack[-1].append(token)
+        return stack[0][0] if stack[0] else None
+
+    def _search_text_part(self, node: list, prefix: str) -> Optional[TextPart]:
+        if node and isinstance(node[0], list):
+            index = 0
+            for child in node:
+                if not isinstance(child, list):
+                    break
+                index += 1
+                found = self._search_text_part(child, f"{prefix}{index}.")
+                if found:
+                    return found
+            return None
+        main_type = str(node[0] or "").lower() if node else ""
+        if not prefix:
+            # 单部分邮件：_extract_body 会直接解码正文（包括 text/html）；非文本类型走完整拉取回退
+            if len(node) < 7 or main_type != "text":
+                raise _BodyStructureError("single-part message without a usable text body")
+        else:
+            if len(node) < 7:
+                return None
+            sub_type = str(node[1] or "").lower()
+            if main_type != "text" or sub_type != "plain":
+                return None
+            disposition = node[9] if len(node) > 9 else None
+            if isinstance(disposition, list) and disposition and str(disposition[0]).lower() == "attachment":
+                return None
+        charset = "utf-8"
+        params = node[2]
+        if isinstance(params, list):
+            for key, value in zip(params[::2], params[1::2]):
+                if str(key).lower() == "charset" and value:
+                    charset = value
+        encoding = str(node[5] or "7bit").lower()
+        # 单部分邮件的正文就是第 1 部分
+        section = prefix[:-1] if prefix else "1"
+        return section, charset, encoding
+
+    @staticmethod
+    def _decode_part(payload: bytes, charset: str, encoding: str) -> str:
+        try:
+            if encoding == "base64":
+                payload = base64.b64decode(payload)
+            elif encoding == "quoted-printable":
+                payload = quopri.decodestring(payload)
+        except Exception:
+            pass
+        try:
+            return payload.decode(charset, errors="replace")
+        except LookupError:
+            return payload.decode("utf-8", errors="replace")
 
     def _connect(self):
         if self.use_ssl:
@@ -133,14 +461,24 @@ class EmailEventIngestor:
         return str(decoded)
 
     def _extract_body(self, msg) -> str:
-        if msg.is_multipart():
-            for part in msg.walk():
-                content_type = part.get_content_type()
-                disposition = part.get("Content-Disposition", "")
-                if content_type == "text/plain" and "attachment" not in disposition:
-                    charset = part.get_content_charset() or "utf-8"
-                    return part.get_payload(decode=True).decode(charset, errors="replace")
-        else:
+        if not msg.is_multipart():
             charset = msg.get_content_charset() or "utf-8"
-            return msg.get_payload(decode=True).decode(charset, errors="replace")
+            return self._decode_payload(msg, charset)
+        # 深度优先，找到第一个非附件的 text/plain 立即返回，其余部分不解码
+        stack = [msg]
+        while stack:
+            part = stack.pop()
+            if part.is_multipart():
+                stack.extend(reversed(part.get_payload()))
+                continue
+            if part.get_content_type() != "text/plain":
+                continue
+            if part.get_content_disposition() == "attachment":
+                continue
+            charset = part.get_content_charset() or "utf-8"
+            return self._decode_payload(part, charset)
         return ""
+
+    def _decode_payload(self, part, charset: str) -> str:
+        # get_payload(decode=True) 已处理传输编码，这里只做字符集解码
+        return self._decode_part(part.get_payload(decode=True) or b"", charset, "binary")
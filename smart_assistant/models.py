@@ -1,11 +1,63 @@
 from __future__ import annotations
 
+import io
 from dataclasses import dataclass, field
 from datetime import datetime
-from typing import List, Optional
+from functools import lru_cache
+from typing import List, Optional, Sequence
 from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
 
+# English month abbreviations and day names for Telegram display
+_MONTHS = ("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec")
+_DAYS = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+# Optional to_human_readable lines, as (field name, template)
+_EVENT_OPTIONAL = (("description", " · Notes: {}"), ("attendees", " · Attendees: {}"))
+_TASK_OPTIONAL = (("notes", "备注: {}"), ("category", "分类: {}"))
+
+
+def _date_iso(dt: datetime) -> str:
+    """Format the date part as YYYY-MM-DD."""
+    return f"{dt.year:04d}-{dt.month:02d}-{dt.day:02d}"
+
+
+def _render_blocks(items, links: Sequence[str], numbered: bool) -> str:
+    """Render items as blank-line separated blocks, each followed by its link if one exists."""
+    buf = io.StringIO()
+    write = buf.write
+    n_links = len(links)
+    for idx, item in enumerate(items):
+        if idx:
+            write("\n\n")
+        if numbered:
+            write(f"{idx + 1}. ")
+        write(item.to_human_readable())
+        if idx < n_links and links[idx]:
+            write("\n链接: ")
+            write(links[idx])
+    return buf.getvalue()
+
+
+def _fmt_date(dt: datetime) -> str:
+    """Format like '5 Jan (Fri)'."""
+    return f"{dt.day} {_MONTHS[dt.month - 1]} ({_DAYS[dt.weekday()]})"
+
+
+@lru_cache(maxsize=128)
+def _resolve_zone(name: str) -> ZoneInfo:
+    """Resolve an IANA timezone name with UTC fallback (memoized)."""
+    try:
+        return ZoneInfo(name)
+    except ZoneInfoNotFoundError:
+        return ZoneInfo("UTC")
+
+
+def _localize(dt: datetime, tz: ZoneInfo) -> datetime:
+    if dt.tzinfo is None:
+        return dt.replace(tzinfo=tz)
+    return dt.astimezone(tz)
+
+
 class EventExtractionError(Exception):
     """Raised when GPT event extraction fails."""
 
@@ -18,7 +70,7 @@ class TaskSyncError(Exception):
     """Raised when the Google Tasks API rejects a task."""
 
 
-@dataclass
+@dataclass(slots=True)
 class CalendarEvent:
     title: str
     start: datetime
@@ -34,45 +86,40 @@ class CalendarEvent:
 
     def _resolve_timezone(self) -> ZoneInfo:
         """Resolve configured timezone with UTC fallback."""
-        try:
-            return ZoneInfo(self.timezone)
-        except ZoneInfoNotFoundError:
-            return ZoneInfo("UTC")
+        return _resolve_zone(self.timezone)
 
     def _normalize_datetime(self, dt: datetime) -> datetime:
-        tz = self._resolve_timezone()
-        if dt.tzinfo is None:
-            return dt.replace(tzinfo=tz)
-        return dt.astimezone(tz)
+        return _localize(dt, self._resolve_timezone())
+
+    @staticmethod
+    def render_many(events: Sequence["CalendarEvent"], links: Sequence[str] = ()) -> str:
+        """Render several events (with their calendar links) as one Telegram message block."""
+        return _render_blocks(events, links, numbered=False)
 
     def to_google_body(self) -> dict:
         """Convert into Google Calendar event payload."""
-        start_dt = self._normalize_datetime(self.start)
-        end_dt = self._normalize_datetime(self.end)
+        tz = self._resolve_timezone()
+        start_dt = _localize(self.start, tz)
+        end_dt = _localize(self.end, tz)
 
         if self.all_day:
-            start_payload = {"date": start_dt.date().isoformat()}
-            end_payload = {"date": end_dt.date().isoformat()}
+            start_payload = {"date": _date_iso(start_dt)}
+            end_payload = {"date": _date_iso(end_dt)}
         else:
-            start_payload = {
-                "dateTime": start_dt.isoformat(),
-                "timeZone": self.timezone,
-            }
-            end_payload = {
-                "dateTime": end_dt.isoformat(),
-                "timeZone": self.timezone,
-            }
+            start_payload = {"dateTime": start_dt.isoformat(), "timeZone": self.timezone}
+            end_payload = {"dateTime": end_dt.isoformat(), "timeZone": self.timezone}
 
         # Build description for Google Calendar (without emoji)
-        description_parts = []
-        if self.description:
-            description_parts.append(self.description)
-        if self.attendees:
-            description_parts.append(f"Attendees: {', '.join(self.attendees)}")
-        if self.category:
-            description_parts.append(f"Category: {self.category}")
-        google_description = "\n".join(description_parts) if description_parts else ""
-        
+        google_description = "\n".join(
+            line
+            for line in (
+                self.description,
+                f"Attendees: {', '.join(self.attendees)}" if self.attendees else "",
+                f"Category: {self.category}" if self.category else "",
+            )
+            if line
+        )
+
         body = {
             "summary": self.title,  # Google Calendar title (no emoji)
             "start": start_payload,
@@ -93,40 +140,29 @@ class CalendarEvent:
 
     def to_human_readable(self) -> str:
         """Return a friendly string for Telegram responses."""
-        start_dt = self._normalize_datetime(self.start)
-        end_dt = self._normalize_datetime(self.end)
+        tz = self._resolve_timezone()
+        start_dt = _localize(self.start, tz)
+        end_dt = _localize(self.end, tz)
         
         # Format date and time
-        # Use English month abbreviations and day names
-        month_names = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 
-                      'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
-        day_names = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
-        
+        start_date = _fmt_date(start_dt)
+        end_date = _fmt_date(end_dt)
+        date_str = start_date if start_date == end_date else f"{start_date} - {end_date}"
         if self.all_day:
-            start_date = f"{start_dt.day} {month_names[start_dt.month-1]} ({day_names[start_dt.weekday()]})"
-            end_date = f"{end_dt.day} {month_names[end_dt.month-1]} ({day_names[end_dt.weekday()]})"
-            if start_date == end_date:
-                date_str = start_date
-            else:
-                date_str = f"{start_date} - {end_date}"
             time_str = "All day"
         else:
-            start_date = f"{start_dt.day} {month_names[start_dt.month-1]} ({day_names[start_dt.weekday()]})"
-            end_date = f"{end_dt.day} {month_names[end_dt.month-1]} ({day_names[end_dt.weekday()]})"
-            start_time = start_dt.strftime("%H:%M")
-            end_time = end_dt.strftime("%H:%M")
-            
-            if start_date == end_date:
-                date_str = start_date
-                time_str = f"{start_time} - {end_time}"
-            else:
-                date_str = f"{start_date} - {end_date}"
-                time_str = f"{start_time} - {end_time}"
+            time_str = (
+                f"{start_dt.hour:02d}:{start_dt.minute:02d} - "
+                f"{end_dt.hour:02d}:{end_dt.minute:02d}"
+            )
         
         # Build formatted output
         emoji_prefix = f"{self.emoji} " if self.emoji else ""
         title_line = f"{emoji_prefix}[{self.title}] Added"
-        
+
+        if not (self.location or self.description or self.attendees):
+            return f"{title_line}\n · Date: {date_str}\n · Time: {time_str}"
+
         parts = [title_line]
         
         if self.location:
@@ -134,17 +170,15 @@ class CalendarEvent:
         
         parts.append(f" · Date: {date_str}")
         parts.append(f" · Time: {time_str}")
-        
-        if self.description:
-            parts.append(f" · Notes: {self.description}")
-        
-        if self.attendees:
-            parts.append(f" · Attendees: {', '.join(self.attendees)}")
-        
+        parts.extend(
+            tpl.format(", ".join(value) if isinstance(value, list) else value)
+            for name, tpl in _EVENT_OPTIONAL
+            if (value := getattr(self, name))
+        )
         return "\n".join(parts)
 
 
-@dataclass
+@dataclass(slots=True)
 class TaskItem:
     title: str
     due: Optional[datetime] = None
@@ -154,10 +188,12 @@ class TaskItem:
     list_name: str = ""
 
     def _resolve_timezone(self) -> ZoneInfo:
-        try:
-            return ZoneInfo(self.timezone)
-        except ZoneInfoNotFoundError:
-            return ZoneInfo("UTC")
+        return _resolve_zone(self.timezone)
+
+    @staticmethod
+    def render_many(tasks: Sequence["TaskItem"], links: Sequence[str] = ()) -> str:
+        """Render several numbered tasks (with their links) as one Telegram message block."""
+        return _render_blocks(tasks, links, numbered=True)
 
     def to_google_body(self) -> dict:
         body = {"title": self.title}
@@ -169,30 +205,29 @@ class TaskItem:
         return body
 
     def _normalize_due(self, dt: datetime) -> datetime:
-        tz = self._resolve_timezone()
-        if dt.tzinfo is None:
-            return dt.replace(tzinfo=tz)
-        return dt.astimezone(tz)
+        return _localize(dt, self._resolve_timezone())
 
     def to_human_readable(self) -> str:
+        if not (self.due or self.notes or self.category):
+            return f"标题: {self.title}"
         parts = [f"标题: {self.title}"]
         if self.due:
             due_dt = self._normalize_due(self.due)
-            parts.append(f"截止: {due_dt.strftime('%Y-%m-%d %H:%M')}")
-        if self.notes:
-            parts.append(f"备注: {self.notes}")
-        if self.category:
-            parts.append(f"分类: {self.category}")
+            parts.append(
+                f"截止: {due_dt.year:04d}-{due_dt.month:02d}-{due_dt.day:02d} "
+                f"{due_dt.hour:02d}:{due_dt.minute:02d}"
+            )
+        parts.extend(tpl.format(value) for name, tpl in _TASK_OPTIONAL if (value := getattr(self, name)))
         return "\n".join(parts)
 
 
-@dataclass
+@dataclass(slots=True)
 class ParsedItems:
     events: List[CalendarEvent] = field(default_factory=list)
     tasks: List[TaskItem] = field(default_factory=list)
 
 
-@dataclass
+@dataclass(slots=True)
 class AssistantResult:
     success: bool
     message: str
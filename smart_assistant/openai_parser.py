@@ -1,19 +1,274 @@
 from __future__ import annotations
 
-import base64
+import atexit
+import binascii
+import difflib
+import hashlib
+import importlib.util
 import json
 import logging
+import mmap
 import os
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional
 from zoneinfo import ZoneInfo
 
+import httpx
 from dateutil import parser as date_parser
-from openai import OpenAI
+from openai import DefaultHttpxClient, OpenAI
+
+try:
+    from rapidfuzz import fuzz as _rf_fuzz, process as _rf_process  # 可选依赖，类别模糊匹配
+except ImportError:
+    _rf_fuzz = _rf_process = None
+
+try:
+    from orjson import dumps as _orjson_dumps, loads as _json_loads  # 可选依赖，JSON 编解码更快
+except ImportError:
+    _orjson_dumps = None
+    _json_loads = json.loads
 
 from .models import CalendarEvent, EventExtractionError, ParsedItems, TaskItem
 from .colors import normalize_color_hint
 
+# HTTP/2 需要可选依赖 h2；保持较多空闲长连接，避免间歇请求重复 TCP/TLS 握手
+_HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+_HTTP_LIMITS = httpx.Limits(max_keepalive_connections=20, max_connections=40, keepalive_expiry=120)
+
+# SDK 内置的指数退避重试次数（覆盖 429、连接错误与 5xx）
+OPENAI_MAX_RETRIES = 3
+# 连续多少次“不支持”类错误后才关闭 Responses API，改走 chat.completions
+RESPONSES_FAILURES_BEFORE_FALLBACK = 2
+
+# 用量统计写盘的最短间隔（秒）
+USAGE_FLUSH_INTERVAL_S = 5.0
+
+# 模型响应缓存的最大条目数
+RESPONSE_CACHE_SIZE = 1024
+# _category_index 最多记住的类别名数量（白名单 + 同义词 + 运行中解析过的名字）
+CATEGORY_INDEX_MAX = 512
+# 图片缓存键中只保留日期部分的上下文字段
+_VOLATILE_CONTEXT_KEYS = frozenset({"current_time_local", "current_time_utc"})
+
+_MIME_BY_EXT = {".png": "png", ".jpg": "jpeg", ".jpeg": "jpeg", ".webp": "webp"}
+# 购物类关键词：命中则归入 shopping 清单
+_SHOPPING_RE = re.compile(r"buy|purchase|grocery|购物|购买|采购|清单|买|囤货", re.IGNORECASE)
+_JSON_OPENER_RE = re.compile(r"[\[{]")
+_RAW_DECODER = json.JSONDecoder()
+_FENCE_RE = re.compile(r"```(?:json)?\s*(.*?)```", re.DOTALL | re.IGNORECASE)
+# 寒暄/确认类短消息（"hi"、"谢谢"、"好的"）不可能包含日程，直接跳过模型调用
+_SMALL_TALK_RE = re.compile(
+    r"(?:hi|hello|hey|thanks?|thank you|thx|ok(?:ay)?|yes|no|cool|nice|好的?|谢谢|多谢|收到|你好|嗯+|哈+)[\s!！.。~～]*",
+    re.IGNORECASE,
+)
+SHORT_TEXT_MAX_LEN = 12
+
+# 常见类别同义词 -> 标准类别（仅当目标在允许列表中时生效）
+_CATEGORY_MAPPINGS = {
+    "health": "medical",
+    "family": "personal",
+    "study": "work",
+    "education": "work",
+    "finance": "work",
+    "shopping": "personal",
+    "trip": "travel",
+    "call": "meeting",
+}
+
+_CATEGORY_KEYS = ("category", "classification", "type")
+_START_KEYS = ("start", "start_time")
+_END_KEYS = ("end", "end_time")
+_DUE_KEYS = ("task_due", "due")
+_NOTES_KEYS = ("task_notes", "description")
+_COLOR_KEYS = ("color_id", "colorId", "color")
+
+
+def _json_dump_bytes(payload) -> bytes:
+    if _orjson_dumps is not None:
+        return _orjson_dumps(payload)
+    return json.dumps(payload, ensure_ascii=False).encode("utf-8")
+
+
+@lru_cache(maxsize=64)
+def _safe_zoneinfo(name: str) -> ZoneInfo:
+    """Resolve an IANA zone name, falling back to UTC for unknown/invalid names."""
+    try:
+        return ZoneInfo(name)
+    except Exception:
+        return ZoneInfo("UTC")
+
+
+@lru_cache(maxsize=128)
+def _build_guidance(categories: tuple, task_lists: tuple) -> str:
+    """Allow-list guidance appended to the system prompt, shared across parser instances.
+
+    Callers pass sorted tuples so the same allow-lists always produce byte-identical text.
+    """
+    guidance_parts: List[str] = []
+    if categories:
+        cats_str = ", ".join(f'"{name}"' for name in categories)
+        guidance_parts.append(
+            f"CRITICAL: When entry_type is \"event\", the category field MUST be exactly one of: [{cats_str}]. "
+            f"Do not use any other category names. If the event doesn't clearly match any category, choose the closest one from this list."
+        )
+    if task_lists:
+        lists_str = ", ".join(f'"{name}"' for name in task_lists)
+        guidance_parts.append(
+            f"When entry_type is \"task\", choose category/task_list only from: [{lists_str}]. Avoid inventing new names; if unsure, pick the closest."
+        )
+    return " ".join(guidance_parts)
+
+
+@lru_cache(maxsize=4)
+def _get_openai_client(api_key: str, base_url: Optional[str]) -> OpenAI:
+    """Share one OpenAI client (and its HTTP connection pool) per api_key/base_url."""
+    client_kwargs = {"api_key": api_key}
+    if base_url:
+        client_kwargs["base_url"] = base_url
+    http_client = DefaultHttpxClient(http2=_HTTP2_AVAILABLE, limits=_HTTP_LIMITS)
+    return OpenAI(http_client=http_client, max_retries=OPENAI_MAX_RETRIES, **client_kwargs)
+
+
+def _iter_output_text(output_items):
+    """Yield output_text chunks from Responses API items (content list or bare string)."""
+    _getattr = getattr
+    for item in output_items:
+        contents = _getattr(item, "content", None)
+        if isinstance(contents, list):
+            for content in contents:
+                if _getattr(content, "type", "") == "output_text":
+                    text_val = _getattr(content, "text", "")
+                    if isinstance(text_val, str) and text_val:
+                        yield text_val
+        elif isinstance(contents, str):
+            yield contents
+        # ignore None or unexpected shapes
+
+
+def _text_from_output_text(response) -> str:
+    """Unified output_text field (OpenAI SDK Responses objects)."""
+    unified_text = getattr(response, "output_text", None)
+    if isinstance(unified_text, str):
+        return unified_text.strip()
+    return ""
+
+
+def _text_from_output_items(response) -> str:
+    """Responses API: response.output -> items whose .content is a list or a bare string."""
+    output_items = getattr(response, "output", None)
+    if not output_items:
+        return ""
+    try:
+        return "\n".join(_iter_output_text(output_items)).strip()
+    except TypeError:
+        # output_items not iterable or malformed
+        return ""
+
+
+def _text_from_choices(response) -> str:
+    """Chat Completions-style objects (message.content, or .text on some SDKs)."""
+    choices = getattr(response, "choices", None)
+    if not choices:
+        return ""
+    chunks: List[str] = []
+    try:
+        for choice in choices:
+            message = getattr(choice, "message", None)
+            if message:
+                content = getattr(message, "content", None)
+                if isinstance(content, str) and content.strip():
+                    chunks.append(content)
+            text_val = getattr(choice, "text", None)
+            if isinstance(text_val, str) and text_val.strip():
+                chunks.append(text_val)
+    except Exception:
+        return ""
+    return "\n".join(chunks).strip()
+
+
+def _text_from_dict(response) -> str:
+    """Raw dict payloads (gateways or proxies that hand back plain JSON instead of SDK objects)."""
+    if not isinstance(response, dict):
+        return ""
+    chunks: List[str] = []
+    if isinstance(response.get("choices"), list):
+        for choice in response["choices"]:
+            msg = choice.get("message") or {}
+            content = msg.get("content") or choice.get("text")
+            if isinstance(content, str) and content.strip():
+                chunks.append(content)
+        if chunks:
+            return "\n".join(chunks).strip()
+    if isinstance(response.get("output"), list):
+        for item in response["output"]:
+            contents = item.get("content")
+            if isinstance(contents, list):
+                for content in contents:
+                    if content.get("type") == "output_text":
+                        t = content.get("text", "")
+                        if isinstance(t, str) and t:
+                            chunks.append(t)
+            elif isinstance(contents, str):
+                chunks.append(contents)
+    return "\n".join(chunks).strip()
+
+
+# _response_to_text 的探测顺序；命中的提取器按模型缓存
+_TEXT_EXTRACTORS = (_text_from_output_text, _text_from_output_items, _text_from_choices, _text_from_dict)
+
+
+def _decode_leading_json(text: str):
+    """Decode the JSON value starting at the first {/[ in text, or return None if incomplete."""
+    match = _JSON_OPENER_RE.search(text)
+    if not match:
+        return None
+    try:
+        return _RAW_DECODER.raw_decode(text, match.start())[0]
+    except json.JSONDecodeError:
+        return None
+
+
+def _closest_category(category: str, allowed: List[str]) -> Optional[str]:
+    """Best fuzzy match among allowed categories (rapidfuzz when installed, else difflib)."""
+    if not allowed:
+        return None
+    if _rf_process is not None:
+        match = _rf_process.extractOne(category, allowed, scorer=_rf_fuzz.WRatio, score_cutoff=70)
+        return match[0] if match else None
+    matches = difflib.get_close_matches(category, allowed, n=1, cutoff=0.7)
+    return matches[0] if matches else None
+
+
+def _pick_time(boundary: dict) -> str:
+    return boundary.get("dateTime") or boundary.get("date") or ""
+
+
+def _format_today_blocks(calendar_items: List[dict], task_items: List[dict]) -> tuple[str, str]:
+    """Render calendar/task items as the bullet blocks used by TODAY_SUMMARY_PROMPT."""
+    calendar_block = "\n".join(
+        f"- {_pick_time(e.get('start', {}))} ~ {_pick_time(e.get('end', {}))} "
+        f"{e.get('summary') or e.get('title') or ''}".strip()
+        for e in calendar_items
+    ) or "- (无)"
+    tasks_block = "\n".join(
+        f"- {t.get('due') or ''} {t.get('title') or ''}".strip() for t in task_items
+    ) or "- (无)"
+    return calendar_block, tasks_block
+
+
+def _first_nonempty(payload: Dict, keys, default=""):
+    """Return the first truthy payload value among keys (same as chained `or`)."""
+    for key in keys:
+        value = payload.get(key)
+        if value:
+            return value
+    return default
+
 PROMPT_TEMPLATE = """
 You are a meticulous executive assistant. Extract calendar-ready entries from the user's input.
 Always respond with valid JSON. Use this schema:
@@ -36,12 +291,15 @@ Always respond with valid JSON. Use this schema:
   "task_list": string (optional name when the user specifies a particular task list)
 }}
 If no schedulable entry exists, set has_entry to false.
-Infer missing timezone from context; default to {default_timezone}.
+Infer missing timezone from context; otherwise use the default timezone given below.
 Use entry_type="task" for to-dos/reminders without fixed meeting slots; otherwise use "event".
 Always try to set category; use "other" only when unsure. Keep titles short but specific.
 Never fabricate URLs, meeting links, QR codes, or map locations—only include them when the user explicitly shares them.
 """
 
+# 模板已不含占位符，导入时格式化一次（仅用于还原 {{ }} 转义）
+_STATIC_SYSTEM_PROMPT = PROMPT_TEMPLATE.format()
+
 PERSONA_EDIT_PROMPT = """
 You are helping maintain a concise persona/preferences document for a single user.
 Given the current markdown and a new user message, update the markdown to reflect stable, reusable preferences.
@@ -74,6 +332,16 @@ TASKS:
 {tasks_block}
 """
 
+
+@dataclass(slots=True)
+class Usage:
+    """Accumulated token usage for one model."""
+
+    prompt: int = 0
+    completion: int = 0
+    total: int = 0
+
+
 class OpenAIEventParser:
     def __init__(
         self,
@@ -87,41 +355,65 @@ class OpenAIEventParser:
         persona_text: Optional[str] = None,
         usage_path: Optional[str] = None,
         audit_logger=None,
+        image_cache_dir: Optional[str] = None,
+        stream_responses: bool = False,
     ):
         self.default_timezone = default_timezone
+        # 图片解析结果的持久化缓存目录（为空则不缓存）
+        self.image_cache_dir = os.path.expanduser(image_cache_dir) if image_cache_dir else ""
+        # 流式调用 Responses API，JSON 完整后即停止拼接与解析增量（仍读到 completed 事件以记录用量）
+        self.stream_responses = stream_responses
         self.text_model = text_model
         self.vision_model = vision_model or text_model
         self.allowed_task_lists = [s.strip() for s in (allowed_task_lists or []) if str(s).strip()]
         self.allowed_event_categories = [s.strip() for s in (allowed_event_categories or []) if str(s).strip()]
+        # 类别索引：允许的类别本身 + 目标在允许列表中的常见同义映射
+        self._category_index = {
+            key: target for key, target in _CATEGORY_MAPPINGS.items() if target in self.allowed_event_categories
+        }
+        self._category_index.update((name, name) for name in self.allowed_event_categories)
+        # 完整 system prompt 的缓存，persona 或白名单变化时置空
+        self._system_prompt_cache: Optional[str] = None
         self.persona_text = (persona_text or "").strip()
         # Usage tracking per model
-        self.usage_by_model: Dict[str, Dict[str, int]] = {}
+        self.usage_by_model: Dict[str, Usage] = {}
+        # 用量写盘做防抖：累计后最多每 USAGE_FLUSH_INTERVAL_S 秒写一次，退出时补写
+        self._usage_lock = threading.Lock()
+        self._usage_flush_timer: Optional[threading.Timer] = None
+        self._usage_atexit_registered = False
         self.usage_path = usage_path or ""
         self.audit_logger = audit_logger  # Optional audit logger for API usage
         # Cache whether the upstream supports Responses API; fallback to chat.completions if not.
         self._responses_supported: bool = True
+        self._responses_failures = 0
+        # model -> 上次成功取出文本的响应结构提取器（见 _response_to_text）
+        self._text_extractor_by_model: Dict[str, Callable[[Any], str]] = {}
+        # 静态模板放在 system prompt 最前面，白名单/时区/persona 依次追加在后，便于上游前缀缓存命中
+        self._system_prompt = _STATIC_SYSTEM_PROMPT
+        # prompt_cache_key 只发给官方 OpenAI 端点，第三方网关可能不认识该字段
+        self._send_prompt_cache_key = not base_url or "api.openai.com" in base_url
         if self.usage_path and os.path.exists(self.usage_path):
             try:
-                with open(self.usage_path, "r", encoding="utf-8") as f:
-                    data = json.load(f)
+                with open(self.usage_path, "rb") as f:
+                    data = _json_loads(f.read())
                     if isinstance(data, dict):
                         # Normalize ints
-                        norm: Dict[str, Dict[str, int]] = {}
+                        norm: Dict[str, Usage] = {}
                         for model_name, stats in data.items():
                             if not isinstance(stats, dict):
                                 continue
-                            norm[model_name] = {
-                                "prompt": int(stats.get("prompt", 0)),
-                                "completion": int(stats.get("completion", 0)),
-                                "total": int(stats.get("total", 0)),
-                            }
+                            norm[model_name] = Usage(
+                                prompt=int(stats.get("prompt", 0)),
+                                completion=int(stats.get("completion", 0)),
+                                total=int(stats.get("total", 0)),
+                            )
                         self.usage_by_model = norm
             except Exception:
                 self.usage_by_model = {}
-        client_kwargs = {"api_key": api_key}
-        if base_url:
-            client_kwargs["base_url"] = base_url
-        self.client = OpenAI(**client_kwargs)
+        self.client = _get_openai_client(api_key, base_url)
+        # 已解析结果的 LRU 缓存：相同模型 + system prompt + 用户内容直接复用（上下文含当前时间，不会跨时段误命中）
+        self._response_cache: OrderedDict = OrderedDict()
+        self._response_cache_lock = threading.Lock()
         self.logger = logging.getLogger(self.__class__.__name__)
 
     def update_models(self, text_model: Optional[str] = None, vision_model: Optional[str] = None) -> None:
@@ -131,11 +423,21 @@ class OpenAIEventParser:
             self.vision_model = vision_model
 
     def parse_text(self, text: str, context: Optional[Dict[str, str]] = None) -> ParsedItems:
-        payload = self._run_completion(
+        if self._is_unschedulable(text):
+            return ParsedItems()
+        _, items = self._run_completion(
             model=self.text_model,
             user_content=[{"type": "input_text", "text": self._build_user_prompt(text, context)}],
         )
-        return self._payload_to_items(payload)
+        return items
+
+    @staticmethod
+    def _is_unschedulable(text: str) -> bool:
+        """Cheap pre-filter for messages that cannot yield an event or task (empty, emoji-only, small talk)."""
+        stripped = text.strip()
+        if len(stripped) >= SHORT_TEXT_MAX_LEN:
+            return False
+        return not any(ch.isalnum() for ch in stripped) or _SMALL_TALK_RE.fullmatch(stripped) is not None
 
     def parse_image(
         self,
@@ -143,8 +445,59 @@ class OpenAIEventParser:
         hint: str = "",
         context: Optional[Dict[str, str]] = None,
     ) -> ParsedItems:
+        cache_key = self._image_cache_key(image_path, hint, context)
+        payload = self._image_cache_load(cache_key)
+        if payload is not None:
+            return self._payload_to_items(payload)
+        content = self._image_content(image_path, hint, context)
+        payload, items = self._run_completion(model=self.vision_model, user_content=content)
+        if items.events or items.tasks:
+            self._image_cache_store(cache_key, payload)
+        return items
+
+    def _image_cache_key(self, image_path: str, hint: str, context: Optional[Dict[str, str]]) -> Optional[str]:
+        """Key vision results by image content, hint, context, model and system prompt."""
+        if not self.image_cache_dir or not os.path.exists(image_path):
+            return None
+        digest = hashlib.sha256()
+        with open(image_path, "rb") as img_file:
+            if os.fstat(img_file.fileno()).st_size:
+                with mmap.mmap(img_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    digest.update(mapped)
+        # 当前时间只保留日期部分：同一天内重复发送同一张图可以命中，跨天则重新解析相对日期
+        stable_context = sorted(
+            (key, str(value)[:10] if key in _VOLATILE_CONTEXT_KEYS else str(value))
+            for key, value in (context or {}).items()
+        )
+        meta = json.dumps([self.vision_model, self._build_system_prompt(), hint, stable_context])
+        digest.update(meta.encode("utf-8"))
+        return digest.hexdigest()
+
+    def _image_cache_load(self, key: Optional[str]):
+        if not key:
+            return None
+        try:
+            with open(os.path.join(self.image_cache_dir, f"{key}.json"), "rb") as f:
+                return _json_loads(f.read())
+        except (OSError, ValueError):
+            return None
+
+    def _image_cache_store(self, key: Optional[str], payload) -> None:
+        if not key or payload is None:
+            return
+        path = os.path.join(self.image_cache_dir, f"{key}.json")
+        tmp_path = f"{path}.tmp"
+        try:
+            os.makedirs(self.image_cache_dir, exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                f.write(_json_dump_bytes(payload))
+            os.replace(tmp_path, path)
+        except (OSError, TypeError, ValueError) as exc:
+            self.logger.warning("Failed to write image cache %s: %s", path, exc)
+
+    def _image_content(self, image_path: str, hint: str, context: Optional[Dict[str, str]]) -> list:
         encoded_image = self._encode_image(image_path)
-        content = [
+        return [
             {"type": "input_text", "text": self._build_user_prompt(hint or "从图片中寻找行程信息。", context)},
             {
                 "type": "input_image",
@@ -153,79 +506,180 @@ class OpenAIEventParser:
                 },
             },
         ]
-        payload = self._run_completion(model=self.vision_model, user_content=content)
-        return self._payload_to_items(payload)
 
-    def _run_completion(self, model: str, user_content):
+    def _run_completion(self, model: str, user_content) -> tuple:
+        """Return (payload, ParsedItems); only payloads that yielded items are cached."""
         system_prompt = self._build_system_prompt()
+        key = self._completion_cache_key(model, system_prompt, user_content)
+        payload = self._cache_get(key)
+        if payload is not None:
+            return payload, self._payload_to_items(payload)
+        payload = self._request_completion(model, system_prompt, user_content)
+        # 先转换校验再缓存：结构异常会在这里抛出，空结果也不缓存，避免把一次失败的回复固定下来
+        items = self._payload_to_items(payload)
+        if items.events or items.tasks:
+            self._cache_put(key, payload)
+        return payload, items
+
+    def _request_completion(self, model: str, system_prompt: str, user_content):
         # If we already detected Responses unsupported or model is Gemini-family, go straight to fallback
         if (not self._responses_supported) or ("gemini" in (model or "").lower()):
             text = self._fallback_chat_completion(model, system_prompt, user_content)
             return self._extract_json(text)
         # Try Responses API first
         try:
-            response = self.client.responses.create(
-                model=model,
-                input=[
-                    {
-                        "role": "system",
-                        "content": system_prompt,
-                    },
-                    {"role": "user", "content": user_content},
-                ],
-            )
-            # Update token usage counters if available
-            try:
-                prompt_toks, completion_toks, total_toks = self._extract_usage(response)
-                if prompt_toks or completion_toks or total_toks:
-                    bucket = self.usage_by_model.setdefault(model, {"prompt": 0, "completion": 0, "total": 0})
-                    bucket["prompt"] += prompt_toks
-                    bucket["completion"] += completion_toks
-                    bucket["total"] += (total_toks or (prompt_toks + completion_toks))
-                    self._persist_usage()
-                    
-                    # 记录到审计日志系统
-                    if self.audit_logger:
-                        try:
-                            self.audit_logger.log_api_usage(
-                                model=model,
-                                prompt_tokens=prompt_toks,
-                                completion_tokens=completion_toks,
-                                total_tokens=total_toks or (prompt_toks + completion_toks),
-                            )
-                        except Exception:
-                            pass  # 不影响主流程
-            except Exception:
-                pass
-            text = self._response_to_text(response)
+            if self.stream_responses:
+                payload = self._stream_completion_json(model, system_prompt, user_content)
+                self._responses_failures = 0
+                return payload
+            response = self.client.responses.create(**self._responses_request(model, system_prompt, user_content))
+            self._responses_failures = 0
+            self._record_usage(model, response)
+            text = self._response_to_text(response, model)
             return self._extract_json(text)
         except Exception as exc:
-            # Mark Responses unsupported on classic gateway errors to avoid repeated failures
-            msg = str(exc).lower()
-            if "not implemented" in msg or "501" in msg or "convert_request_failed" in msg or "500" in msg:
-                self._responses_supported = False
+            self._note_responses_error(exc)
             # Fallback to Chat Completions for gateways (e.g., Gemini proxy) that don't implement Responses API
             text = self._fallback_chat_completion(model, system_prompt, user_content)
             return self._extract_json(text)
 
+    def _stream_completion_json(self, model: str, system_prompt: str, user_content):
+        """Stream the Responses API and decode the JSON as soon as it is complete.
+
+        The stream is still read through to response.completed so usage is always recorded.
+        """
+        stream = self.client.responses.create(
+            stream=True, **self._responses_request(model, system_prompt, user_content)
+        )
+        chunks: List[str] = []
+        payload = None
+        try:
+            for event in stream:
+                event_type = getattr(event, "type", "")
+                if event_type == "response.output_text.delta" and payload is None:
+                    delta = event.delta or ""
+                    chunks.append(delta)
+                    # 只有出现闭合括号时才尝试解析；JSON 完整后不再拼接和解析后续增量
+                    if "}" in delta or "]" in delta:
+                        payload = _decode_leading_json("".join(chunks))
+                elif event_type == "response.completed":
+                    # 用量只在最后一个事件里，必须读到这里才能记账
+                    self._record_usage(model, event.response)
+                    break
+        finally:
+            stream.close()
+        if payload is not None:
+            return payload
+        return self._extract_json("".join(chunks))
+
+    @staticmethod
+    def _completion_cache_key(model: str, system_prompt: str, user_content) -> str:
+        # user_content 含 base64 图片时同样参与哈希，相同图片+提示自然命中
+        raw = json.dumps({"m": model, "s": system_prompt, "u": user_content}, sort_keys=True, default=str)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _cache_get(self, key: str):
+        with self._response_cache_lock:
+            payload = self._response_cache.get(key)
+            if payload is not None:
+                self._response_cache.move_to_end(key)
+            return payload
+
+    def _cache_put(self, key: str, payload) -> None:
+        if payload is None:
+            return
+        with self._response_cache_lock:
+            self._response_cache[key] = payload
+            self._response_cache.move_to_end(key)
+            while len(self._response_cache) > RESPONSE_CACHE_SIZE:
+                self._response_cache.popitem(last=False)
+
+    def _responses_request(self, model: str, system_prompt: str, user_content) -> dict:
+        """Keyword arguments for an extraction call to client.responses.create."""
+        return {
+            "model": model,
+            "input": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_content},
+            ],
+            **self._prompt_cache_kwargs(model),
+        }
+
+    def _prompt_cache_kwargs(self, model: str) -> dict:
+        # 通过 extra_body 传递，兼容尚未声明 prompt_cache_key 参数的旧版 SDK
+        if not self._send_prompt_cache_key:
+            return {}
+        key = f"assistant:{model}:{self._persona_digest}" if self._persona_digest else f"assistant:{model}"
+        return {"extra_body": {"prompt_cache_key": key}}
+
+    def _note_responses_error(self, exc: Exception) -> None:
+        # Mark Responses unsupported on classic gateway errors to avoid repeated failures
+        msg = str(exc).lower()
+        if "not implemented" in msg or "501" in msg or "convert_request_failed" in msg or "500" in msg:
+            # SDK 已对 429/5xx 做过退避重试；连续两次仍失败才认定网关不支持，避免偶发 500 永久关闭
+            self._responses_failures += 1
+            if self._responses_failures >= RESPONSES_FAILURES_BEFORE_FALLBACK:
+                self._responses_supported = False
+
+    def _record_usage(self, model: str, response) -> None:
+        """Update token usage counters (and the audit log) if the response reports usage."""
+        try:
+            prompt_toks, completion_toks, total_toks = self._extract_usage(response)
+            if prompt_toks or completion_toks or total_toks:
+                with self._usage_lock:
+                    bucket = self.usage_by_model.get(model)
+                    if bucket is None:
+                        bucket = self.usage_by_model[model] = Usage()
+                    bucket.prompt += prompt_toks
+                    bucket.completion += completion_toks
+                    bucket.total += (total_toks or (prompt_toks + completion_toks))
+                self._schedule_usage_flush()
+
+                # 记录到审计日志系统
+                if self.audit_logger:
+                    try:
+                        self.audit_logger.log_api_usage(
+                            model=model,
+                            prompt_tokens=prompt_toks,
+                            completion_tokens=completion_toks,
+                            total_tokens=total_toks or (prompt_toks + completion_toks),
+                        )
+                    except Exception:
+                        pass  # 不影响主流程
+        except Exception:
+            pass
+
+    @property
+    def persona_text(self) -> str:
+        return self._persona_text
+
+    @persona_text.setter
+    def persona_text(self, value: str) -> None:
+        # persona 可能在运行时被编辑模式更新，需要重建 system prompt
+        self._persona_text = value
+        # prompt_cache_key 按 persona 分槽，编辑 persona 后不会与旧前缀争用同一缓存
+        self._persona_digest = hashlib.sha1(value.encode("utf-8")).hexdigest()[:12] if value else ""
+        self._invalidate_system_prompt()
+
+    def _invalidate_system_prompt(self) -> None:
+        """Drop the memoized system prompt; call after changing persona or allow-lists."""
+        self._system_prompt_cache = None
+
     def _build_system_prompt(self) -> str:
-        prompt = PROMPT_TEMPLATE.format(default_timezone=self.default_timezone)
-        guidance_parts: List[str] = []
+        if self._system_prompt_cache is not None:
+            return self._system_prompt_cache
+        # 顺序按稳定性从高到低：静态模板 → 白名单（排序）→ 时区 → persona；persona 编辑只影响末尾
+        parts = [self._system_prompt]
+        guidance = _build_guidance(
+            tuple(sorted(self.allowed_event_categories)), tuple(sorted(self.allowed_task_lists))
+        )
+        if guidance:
+            parts.append(guidance)
+        parts.append(f"Default timezone: {self.default_timezone}")
         if self.persona_text:
-            guidance_parts.append(f"User preferences and persona: {self.persona_text}")
-        if self.allowed_event_categories:
-            cats_str = ", ".join(f'"{name}"' for name in self.allowed_event_categories)
-            guidance_parts.append(
-                f"CRITICAL: When entry_type is \"event\", the category field MUST be exactly one of: [{cats_str}]. "
-                f"Do not use any other category names. If the event doesn't clearly match any category, choose the closest one from this list."
-            )
-        if self.allowed_task_lists:
-            lists_str = ", ".join(f'"{name}"' for name in self.allowed_task_lists)
-            guidance_parts.append(
-                f"When entry_type is \"task\", choose category/task_list only from: [{lists_str}]. Avoid inventing new names; if unsure, pick the closest."
-            )
-        if guidance_parts:
-            prompt = prompt + "\n" + " ".join(guidance_parts)
+            parts.append(f"User preferences and persona: {self.persona_text}")
+        prompt = "\n".join(parts)
+        self._system_prompt_cache = prompt
         return prompt
 
     def refine_persona_markdown(self, current_markdown: str, user_message: str) -> str:
@@ -242,7 +696,7 @@ class OpenAIEventParser:
                 {"role": "user", "content": [{"type": "input_text", "text": user_content}]},
             ],
         )
-        text = self._response_to_text(response)
+        text = self._response_to_text(response, self.text_model)
         return (text or "").strip()
 
     def map_task_to_allowed(self, title: str, notes: str = "") -> tuple[str, str]:
@@ -262,6 +716,11 @@ class OpenAIEventParser:
             f"\n\nTitle: {title}\nNotes: {notes or ''}",
         ]
         user_text = "".join(user_text_parts)
+        # 相同标题/备注 + 白名单的映射结果复用响应缓存
+        cache_key = self._completion_cache_key(self.text_model, system_prompt, user_text)
+        cached = self._cache_get(cache_key)
+        if cached is not None:
+            return cached
         # Prefer Responses API
         try:
             response = self.client.responses.create(
@@ -271,24 +730,28 @@ class OpenAIEventParser:
                     {"role": "user", "content": [{"type": "input_text", "text": user_text}]},
                 ],
             )
-            text = self._response_to_text(response)
+            text = self._response_to_text(response, self.text_model)
         except Exception:
             text = self._fallback_chat_completion(
                 self.text_model,
                 system_prompt,
                 [{"type": "input_text", "text": user_text}],
             )
+        result = ("", "")
         try:
             data = self._extract_json(text)
             cat = (data.get("category") or "").strip().lower()
             lst = (data.get("task_list") or "").strip().lower()
-            if cat in [p.lower() for p in presets]:
-                return cat, cat if not lst or lst not in [p.lower() for p in presets] else lst
-            if lst in [p.lower() for p in presets]:
-                return lst, lst
+            presets_lower = {p.lower() for p in presets}
+            if cat in presets_lower:
+                result = (cat, cat if not lst or lst not in presets_lower else lst)
+            elif lst in presets_lower:
+                result = (lst, lst)
         except Exception:
             pass
-        return "", ""
+        if result[0]:
+            self._cache_put(cache_key, result)
+        return result
 
     def _fallback_chat_completion(self, model: str, system_prompt: str, user_content) -> str:
         """Fallback path using chat.completions when Responses API is not available."""
@@ -322,29 +785,7 @@ class OpenAIEventParser:
 
         try:
             chat = self.client.chat.completions.create(model=model, messages=messages)
-            # Update usage if available
-            try:
-                prompt_toks, completion_toks, total_toks = self._extract_usage(chat)
-                if prompt_toks or completion_toks or total_toks:
-                    bucket = self.usage_by_model.setdefault(model, {"prompt": 0, "completion": 0, "total": 0})
-                    bucket["prompt"] += prompt_toks
-                    bucket["completion"] += completion_toks
-                    bucket["total"] += (total_toks or (prompt_toks + completion_toks))
-                    self._persist_usage()
-                    
-                    # 记录到审计日志系统
-                    if self.audit_logger:
-                        try:
-                            self.audit_logger.log_api_usage(
-                                model=model,
-                                prompt_tokens=prompt_toks,
-                                completion_tokens=completion_toks,
-                                total_tokens=total_toks or (prompt_toks + completion_toks),
-                            )
-                        except Exception:
-                            pass  # 不影响主流程
-            except Exception:
-                pass
+            self._record_usage(model, chat)
             # Extract text
             if hasattr(chat, "choices") and chat.choices:
                 choice = chat.choices[0]
@@ -364,78 +805,19 @@ class OpenAIEventParser:
             pass
         return ""
 
-    def _response_to_text(self, response) -> str:
-        # 1) Prefer unified field if present (some providers expose output_text)
-        unified_text = getattr(response, "output_text", None)
-        if isinstance(unified_text, str) and unified_text.strip():
-            return unified_text.strip()
-
-        # 2) Responses API: response.output -> list of items, each with .content (list) or .content == None
-        chunks: List[str] = []
-        output_items = getattr(response, "output", None)
-        if output_items:
-            try:
-                for item in output_items:
-                    contents = getattr(item, "content", None)
-                    if isinstance(contents, list):
-                        for content in contents:
-                            if getattr(content, "type", "") == "output_text":
-                                text_val = getattr(content, "text", "")
-                                if isinstance(text_val, str) and text_val:
-                                    chunks.append(text_val)
-                    elif isinstance(contents, str):
-                        chunks.append(contents)
-                    # ignore None or unexpected shapes
-            except TypeError:
-                # In case output_items is not iterable or malformed, ignore and fall back
-                pass
-        if chunks:
-            return "\n".join(chunks).strip()
-
-        # 3) Chat Completions-style fallback
-        if hasattr(response, "choices"):
-            try:
-                for choice in response.choices:
-                    message = getattr(choice, "message", None)
-                    if message:
-                        content = getattr(message, "content", None)
-                        if isinstance(content, str) and content.strip():
-                            chunks.append(content)
-                    # some SDKs use 'text'
-                    text_val = getattr(choice, "text", None)
-                    if isinstance(text_val, str) and text_val.strip():
-                        chunks.append(text_val)
-                if chunks:
-                    return "\n".join(chunks).strip()
-            except Exception:
-                pass
-
-        # 4) Dict-based fallbacks (if a raw dict leaked through)
-        if isinstance(response, dict):
-            # OpenAI chat completions
-            if isinstance(response.get("choices"), list):
-                for choice in response["choices"]:
-                    msg = choice.get("message") or {}
-                    content = msg.get("content") or choice.get("text")
-                    if isinstance(content, str) and content.strip():
-                        chunks.append(content)
-                if chunks:
-                    return "\n".join(chunks).strip()
-            # Responses API-like
-            if isinstance(response.get("output"), list):
-                for item in response["output"]:
-                    contents = item.get("content")
-                    if isinstance(contents, list):
-                        for content in contents:
-                            if content.get("type") == "output_text":
-                                t = content.get("text", "")
-                                if isinstance(t, str) and t:
-                                    chunks.append(t)
-                    elif isinstance(contents, str):
-                        chunks.append(contents)
-                if chunks:
-                    return "\n".join(chunks).strip()
-
+    def _response_to_text(self, response, model: str = "") -> str:
+        # 同一模型的响应结构固定：记住上次命中的提取器，后续调用直接走它，不再逐个探测
+        extractor = self._text_extractor_by_model.get(model) if model else None
+        if extractor is not None:
+            text = extractor(response)
+            if text:
+                return text
+        for candidate in _TEXT_EXTRACTORS:
+            text = candidate(response)
+            if text:
+                if model:
+                    self._text_extractor_by_model[model] = candidate
+                return text
         # Nothing found; return empty string to let caller handle
         return ""
 
@@ -473,104 +855,99 @@ class OpenAIEventParser:
     def get_usage_summary_lines(self) -> List[str]:
         if not self.usage_by_model:
             return ["暂无用量数据。"]
-        lines: List[str] = []
-        for model_name in sorted(self.usage_by_model.keys()):
-            stats = self.usage_by_model.get(model_name, {})
-            lines.append(
-                f"{model_name}: prompt={int(stats.get('prompt', 0))}, completion={int(stats.get('completion', 0))}, total={int(stats.get('total', 0))}"
-            )
-        return lines
+        with self._usage_lock:
+            # 在锁内取快照：其他线程的 _record_usage 可能同时写入新模型
+            rows = sorted(self.usage_by_model.items())
+        return [f"{name}: prompt={u.prompt}, completion={u.completion}, total={u.total}" for name, u in rows]
+
+    def _schedule_usage_flush(self) -> None:
+        if not self.usage_path:
+            return
+        with self._usage_lock:
+            if self._usage_flush_timer is not None:
+                return
+            if not self._usage_atexit_registered:
+                atexit.register(self.flush_usage)
+                self._usage_atexit_registered = True
+            timer = threading.Timer(USAGE_FLUSH_INTERVAL_S, self.flush_usage)
+            timer.daemon = True
+            self._usage_flush_timer = timer
+        timer.start()
+
+    def flush_usage(self) -> None:
+        """Write pending usage counters to usage_path (atomic replace)."""
+        with self._usage_lock:
+            timer, self._usage_flush_timer = self._usage_flush_timer, None
+            if timer is None:
+                return
+            timer.cancel()
+            payload = {name: asdict(stats) for name, stats in self.usage_by_model.items()}
+        self._persist_usage(payload)
 
-    def _persist_usage(self) -> None:
+    def _persist_usage(self, payload: Dict[str, Dict[str, int]]) -> None:
         if not self.usage_path:
             return
+        tmp_path = f"{self.usage_path}.tmp"
         try:
-            payload = self.usage_by_model
-            with open(self.usage_path, "w", encoding="utf-8") as f:
-                json.dump(payload, f, ensure_ascii=False)
+            with open(tmp_path, "wb") as f:
+                f.write(_json_dump_bytes(payload))
+            os.replace(tmp_path, self.usage_path)
         except Exception:
             pass
 
     def summarize_today(self, date_str: str, tz: str, calendar_items: List[dict], task_items: List[dict]) -> str:
         """Generate a concise Chinese summary for today's agenda."""
-        def format_event(e: dict) -> str:
-            title = e.get("summary") or e.get("title") or ""
-            start = e.get("start", {})
-            end = e.get("end", {})
-            def pick_time(x):
-                return x.get("dateTime") or x.get("date") or ""
-            return f"- {pick_time(start)} ~ {pick_time(end)} {title}".strip()
-
-        def format_task(t: dict) -> str:
-            title = t.get("title") or ""
-            due = t.get("due") or ""
-            return f"- {due} {title}".strip()
-
-        calendar_block = "\n".join(format_event(e) for e in calendar_items) or "- (无)"
-        tasks_block = "\n".join(format_task(t) for t in task_items) or "- (无)"
+        calendar_block, tasks_block = _format_today_blocks(calendar_items, task_items)
         user_content = TODAY_SUMMARY_PROMPT.format(
             date_str=date_str, tz=tz, calendar_block=calendar_block, tasks_block=tasks_block
         )
+        return self._complete_plain_text("You write concise daily plans.", user_content)
+
+    def _complete_plain_text(self, system_prompt: str, user_text: str) -> str:
+        """Run a free-text completion (Responses API first, chat fallback) and return stripped text."""
+        user_content = [{"type": "input_text", "text": user_text}]
         # Prefer Responses API unless disabled for this model
         if (not self._responses_supported) or ("gemini" in (self.text_model or "").lower()):
-            text = self._fallback_chat_completion(
-                self.text_model, "You write concise daily plans.", [{"type": "input_text", "text": user_content}]
-            )
+            text = self._fallback_chat_completion(self.text_model, system_prompt, user_content)
             return (text or "").strip()
         try:
             response = self.client.responses.create(
                 model=self.text_model,
                 input=[
-                    {"role": "system", "content": "You write concise daily plans."},
-                    {"role": "user", "content": [{"type": "input_text", "text": user_content}]},
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": user_content},
                 ],
             )
-            text = self._response_to_text(response)
+            text = self._response_to_text(response, self.text_model)
             return (text or "").strip()
         except Exception:
-            text = self._fallback_chat_completion(
-                self.text_model, "You write concise daily plans.", [{"type": "input_text", "text": user_content}]
-            )
+            text = self._fallback_chat_completion(self.text_model, system_prompt, user_content)
             return (text or "").strip()
 
     def _extract_json(self, raw_text: str):
-        normalized = self._strip_code_fences(raw_text)
-        candidates = [normalized, raw_text.strip()]
+        try:
+            return _json_loads(raw_text)
+        except json.JSONDecodeError:
+            pass
 
-        for candidate in candidates:
-            if not candidate:
-                continue
+        normalized = raw_text
+        match = _FENCE_RE.search(raw_text)
+        if match:
+            normalized = match.group(1)
             try:
-                return json.loads(candidate)
+                return _json_loads(normalized)
             except json.JSONDecodeError:
-                continue
+                pass
 
-        # Fallback: slice between braces/brackets
-        for opener, closer in [("{", "}"), ("[", "]")]:
-            start = normalized.find(opener)
-            end = normalized.rfind(closer)
-            if start == -1 or end == -1 or end <= start:
-                continue
-            snippet = normalized[start : end + 1]
+        # Fallback: decode the first JSON value starting at any {/[ (trailing text is ignored)
+        for match in _JSON_OPENER_RE.finditer(normalized):
             try:
-                return json.loads(snippet)
+                return _RAW_DECODER.raw_decode(normalized, match.start())[0]
             except json.JSONDecodeError:
                 continue
 
         raise EventExtractionError(f"模型输出中没有找到有效 JSON: {raw_text}")
 
-    def _strip_code_fences(self, text: str) -> str:
-        stripped = text.strip()
-        if stripped.startswith("```"):
-            parts = stripped.split("```")
-            if len(parts) >= 3:
-                candidate = parts[1]
-                candidate = candidate.lstrip()
-                if candidate.lower().startswith("json"):
-                    candidate = candidate.split("\n", 1)[1] if "\n" in candidate else ""
-                stripped = candidate.strip()
-        return stripped
-
     def _payload_to_items(self, payload) -> ParsedItems:
         parsed = ParsedItems()
         if not payload:
@@ -581,20 +958,24 @@ class OpenAIEventParser:
         elif isinstance(payload, list):
             candidates = payload
         elif isinstance(payload, dict):
-            candidates = [payload]
+            # 单条且明确无条目（常见的“非日程消息”回复）直接返回
+            if payload.get("has_entry") is False and payload.get("has_event") is False:
+                return parsed
+            candidates = (payload,)
         else:
             raise EventExtractionError("模型返回了无法识别的结构。")
 
+        # entry_type -> (目标列表, 转换函数)，未知类型按 event 处理
+        dispatch = {"task": (parsed.tasks, self._dict_to_task)}
+        default = (parsed.events, self._dict_to_event)
         for item in candidates:
             if not isinstance(item, dict):
                 continue
             if item.get("has_entry") is False and item.get("has_event") is False:
                 continue
-            entry_type = (item.get("entry_type") or "").lower()
-            if entry_type == "task":
-                parsed.tasks.append(self._dict_to_task(item))
-            else:
-                parsed.events.append(self._dict_to_event(item))
+            entry_type = item.get("entry_type") or ""
+            bucket, handler = dispatch.get(entry_type) or dispatch.get(entry_type.lower(), default)
+            bucket.append(handler(item))
 
         return parsed
 
@@ -605,49 +986,47 @@ class OpenAIEventParser:
         
         category_lower = category.strip().lower()
         original_category = category_lower
-        
-        # Exact match
-        if category_lower in self.allowed_event_categories:
-            return category_lower
-        
-        # Common mappings for similar categories
-        category_mappings = {
-            "health": "medical",
-            "family": "personal",
-            "study": "work",
-            "education": "work",
-            "finance": "work",
-            "shopping": "personal",
-            "trip": "travel",
-            "call": "meeting",
-        }
-        
-        # Try mapping
-        mapped = category_mappings.get(category_lower)
-        if mapped and mapped in self.allowed_event_categories:
-            self.logger.info("Mapped category '%s' to '%s'", original_category, mapped)
-            return mapped
-        
+
+        # Exact match, or a common synonym whose target is allowed
+        hit = self._category_index.get(category_lower)
+        if hit:
+            if hit != category_lower:
+                self.logger.info("Mapped category '%s' to '%s'", original_category, hit)
+            return hit
+
+        resolved = self._resolve_category(category_lower)
+        # 记住模糊/兜底结果，同一类别名再次出现时直接命中索引（上限防止异常输入无限增长）
+        if len(self._category_index) < CATEGORY_INDEX_MAX:
+            self._category_index[category_lower] = resolved
+        return resolved
+
+    def _resolve_category(self, category_lower: str) -> str:
+        """Slow path of _normalize_category: substring, then fuzzy, then first allowed category."""
         # Find closest match by substring or similarity
         for allowed in self.allowed_event_categories:
             if allowed in category_lower or category_lower in allowed:
-                self.logger.info("Mapped category '%s' to '%s' (substring match)", original_category, allowed)
+                self.logger.info("Mapped category '%s' to '%s' (substring match)", category_lower, allowed)
                 return allowed
         
+        # Fuzzy match for typos / near-misses
+        fuzzy = _closest_category(category_lower, self.allowed_event_categories)
+        if fuzzy:
+            self.logger.info("Mapped category '%s' to '%s' (fuzzy match)", category_lower, fuzzy)
+            return fuzzy
+
         # If no match found, use the first allowed category as fallback
         fallback = self.allowed_event_categories[0]
-        self.logger.warning("Category '%s' not in allowed list, using fallback '%s'", original_category, fallback)
+        self.logger.warning("Category '%s' not in allowed list, using fallback '%s'", category_lower, fallback)
         return fallback
 
     def _dict_to_event(self, payload: Dict) -> CalendarEvent:
         title = payload.get("title") or "Untitled Event"
         timezone = payload.get("timezone") or self.default_timezone
         all_day = bool(payload.get("all_day"))
-        category = (payload.get("category") or payload.get("classification") or payload.get("type") or "").strip()
-        category = self._normalize_category(category)
+        category = self._normalize_category(_first_nonempty(payload, _CATEGORY_KEYS).strip())
 
-        start_str = payload.get("start") or payload.get("start_time")
-        end_str = payload.get("end") or payload.get("end_time")
+        start_str = _first_nonempty(payload, _START_KEYS, None)
+        end_str = _first_nonempty(payload, _END_KEYS, None)
 
         if not start_str:
             raise EventExtractionError("模型没有返回开始时间。")
@@ -660,43 +1039,36 @@ class OpenAIEventParser:
             end_dt = start_dt + delta
 
         attendees = payload.get("attendees") or []
+        # 只有逗号分隔的字符串需要拆分；模型返回的列表直接复用
         if isinstance(attendees, str):
-            attendees = [att.strip() for att in attendees.split(",") if att.strip()]
-
-        description = payload.get("description") or ""
-        location = payload.get("location") or ""
-        color_hint = payload.get("color_id") or payload.get("colorId") or payload.get("color")
-        color_id = normalize_color_hint(color_hint)
-        emoji = (payload.get("emoji") or "").strip()
+            attendees = [att for att in (part.strip() for part in attendees.split(",")) if att]
 
         return CalendarEvent(
             title=title.strip(),
             start=start_dt,
             end=end_dt,
             timezone=timezone,
-            description=description.strip(),
-            location=location.strip(),
+            description=(payload.get("description") or "").strip(),
+            location=(payload.get("location") or "").strip(),
             attendees=attendees,
             all_day=all_day,
             category=category,
-            color_id=color_id,
-            emoji=emoji,
+            color_id=normalize_color_hint(_first_nonempty(payload, _COLOR_KEYS, None)),
+            emoji=(payload.get("emoji") or "").strip(),
         )
 
     def _dict_to_task(self, payload: Dict) -> TaskItem:
         title = payload.get("title") or "Untitled Task"
         timezone = payload.get("timezone") or self.default_timezone
-        due_str = payload.get("task_due") or payload.get("due") or ""
-        notes = payload.get("task_notes") or payload.get("description") or ""
-        category = (payload.get("category") or payload.get("classification") or payload.get("type") or "").strip()
+        due_str = _first_nonempty(payload, _DUE_KEYS)
+        notes = _first_nonempty(payload, _NOTES_KEYS)
+        category = _first_nonempty(payload, _CATEGORY_KEYS).strip()
         task_list_name = (payload.get("task_list") or "").strip()
         # If user didn't specify a list but we have a category, use category as list hint
         if not task_list_name and category:
             task_list_name = category
         # Heuristic: shopping-related titles/notes should go to 'shopping'
-        shopping_keywords = ["buy", "purchase", "grocery", "购物", "购买", "采购", "清单", "买", "囤货"]
-        text_blob = f"{title} {notes}".lower()
-        if any(kw in text_blob for kw in shopping_keywords):
+        if _SHOPPING_RE.search(title) or _SHOPPING_RE.search(notes):
             category = "shopping"
             if not task_list_name:
                 task_list_name = "shopping"
@@ -717,34 +1089,31 @@ class OpenAIEventParser:
         )
 
     def _parse_datetime(self, value: str, fallback_tz: str) -> datetime:
-        parsed = date_parser.isoparse(value)
+        try:
+            # Python 3.10 的 fromisoformat 不认 "Z" 后缀，先换成 +00:00 以走快速路径
+            parsed = datetime.fromisoformat(value[:-1] + "+00:00" if value.endswith("Z") else value)
+        except ValueError:
+            parsed = date_parser.isoparse(value)
         if parsed.tzinfo is None:
-            try:
-                tz = ZoneInfo(fallback_tz)
-            except Exception:
-                tz = ZoneInfo("UTC")
-            parsed = parsed.replace(tzinfo=tz)
+            parsed = parsed.replace(tzinfo=_safe_zoneinfo(fallback_tz))
         return parsed
 
     def _build_user_prompt(self, text: str, context: Optional[Dict[str, str]]) -> str:
-        parts = [text.strip()]
-        if context:
-            context_str = "\n".join(f"{key}: {value}" for key, value in context.items() if value)
-            parts.append("上下文:\n" + context_str)
-        return "\n\n".join(parts)
+        if not context:
+            return text.strip()
+        # 键排序保证相同上下文生成字节一致的 prompt，利于本地与上游缓存命中
+        context_str = "\n".join(f"{key}: {value}" for key, value in sorted(context.items()) if value)
+        return f"{text.strip()}\n\n上下文:\n{context_str}"
 
     def _encode_image(self, path: str) -> str:
         if not os.path.exists(path):
             raise EventExtractionError(f"图片 {path} 不存在。")
         with open(path, "rb") as img_file:
-            return base64.b64encode(img_file.read()).decode("utf-8")
+            if os.fstat(img_file.fileno()).st_size == 0:
+                return ""
+            # mmap 让 base64 编码直接读页缓存，避免再复制一份原始字节
+            with mmap.mmap(img_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                return binascii.b2a_base64(mapped, newline=False).decode("ascii")
 
     def _guess_mime_suffix(self, path: str) -> str:
-        lower = path.lower()
-        if lower.endswith(".png"):
-            return "png"
-        if lower.endswith(".jpg") or lower.endswith(".jpeg"):
-            return "jpeg"
-        if lower.endswith(".webp"):
-            return "webp"
-        return "png"
+        return _MIME_BY_EXT.get(os.path.splitext(path)[1].lower(), "png")
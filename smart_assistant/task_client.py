@@ -1,8 +1,11 @@
 from __future__ import annotations
 
+import hashlib
 import logging
-from typing import Dict, Optional, Tuple, List, Set
-from datetime import datetime, timedelta, timezone
+import re
+import time
+from typing import Dict, FrozenSet, Optional, Set, Tuple, List
+from datetime import date, datetime, timedelta, timezone
 from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
 from google.oauth2.credentials import Credentials
@@ -12,21 +15,56 @@ from googleapiclient.errors import HttpError
 from .models import TaskItem, TaskSyncError
 from dateutil import parser as date_parser
 
+try:
+    from rapidfuzz import fuzz as _rf_fuzz, process as _rf_process  # optional, faster list-name matching
+except ImportError:
+    _rf_fuzz = _rf_process = None
+
+# Task-list name -> id mapping is reused for this long before re-fetching from the API
+LIST_CACHE_TTL_S = 900.0
+# Google batch endpoints accept at most this many sub-requests per HTTP call
+BATCH_MAX_REQUESTS = 50
+# selfLink looks like https://www.googleapis.com/tasks/v1/lists/<list id>/tasks/<task id>
+_LIST_ID_RE = re.compile(r"/lists/([^/]+)/tasks/")
+
 
 class GoogleTaskClient:
+    # (account digest, preset names, max_lists) combinations whose preset lists were already ensured this process
+    _bootstrapped_presets: Set[Tuple[str, FrozenSet[str], int]] = set()
+
     def __init__(self, credentials: Credentials, task_list_id: str = "@default", preset_list_names: Optional[List[str]] = None, max_lists: int = 5):
         self.logger = logging.getLogger(self.__class__.__name__)
         self.service = build("tasks", "v1", credentials=credentials, cache_discovery=False)
         self.task_list_id = task_list_id or "@default"
         self._list_cache_by_name: Dict[str, str] = {}  # lowercase title -> id
+        self._list_cache_expiry = 0.0  # monotonic deadline for _list_cache_by_name
         self._default_list_id: Optional[str] = None
         self._max_lists = max(1, int(max_lists))
-        self._preset_names: Set[str] = set(n.strip().lower() for n in (preset_list_names or []) if str(n).strip())
+        self._preset_names: FrozenSet[str] = frozenset(
+            n.strip().lower() for n in (preset_list_names or []) if str(n).strip()
+        )
         if self._preset_names:
-            try:
-                self._ensure_preset_lists()
-            except Exception as exc:
-                self.logger.warning("Failed to ensure preset task lists: %s", exc)
+            # Re-auth creates a new client for the same account; skip the repeated list/insert round trips
+            account = self._account_key(credentials)
+            bootstrap_key = (account or "", self._preset_names, self._max_lists)
+            if account is None or bootstrap_key not in GoogleTaskClient._bootstrapped_presets:
+                try:
+                    self._ensure_preset_lists()
+                    if account is not None:
+                        GoogleTaskClient._bootstrapped_presets.add(bootstrap_key)
+                except Exception as exc:
+                    self.logger.warning("Failed to ensure preset task lists: %s", exc)
+
+    @staticmethod
+    def _account_key(credentials: Credentials) -> Optional[str]:
+        """Stable, non-secret identity for the account behind credentials (None if unknown)."""
+        refresh_token = getattr(credentials, "refresh_token", None)
+        if not refresh_token:
+            # Without a refresh token there is no identity that outlives the object; always bootstrap
+            return None
+        # Only a digest is kept so the process-wide set never holds the token itself
+        client_id = getattr(credentials, "client_id", None) or ""
+        return hashlib.sha256(f"{client_id}:{refresh_token}".encode("utf-8")).hexdigest()
 
     def create_task(self, task: TaskItem) -> str:
         body = task.to_google_body()
@@ -71,25 +109,29 @@ class GoogleTaskClient:
 
     def _refresh_list_cache(self) -> Dict[str, str]:
         resp = self.service.tasklists().list(maxResults=100).execute()
-        mapping: Dict[str, str] = {}
-        for item in resp.get("items", []) or []:
-            name = (item.get("title") or "").strip().lower()
-            list_id = item.get("id") or ""
-            if name and list_id:
-                mapping[name] = list_id
+        mapping: Dict[str, str] = {
+            name: list_id
+            for item in resp.get("items", []) or []
+            if (name := (item.get("title") or "").strip().lower()) and (list_id := item.get("id"))
+        }
         self._list_cache_by_name = mapping
+        self._list_cache_expiry = time.monotonic() + LIST_CACHE_TTL_S
         return mapping
 
+    def _get_cached_mapping(self) -> Dict[str, str]:
+        """Return the list mapping, re-fetching it only once the TTL has expired."""
+        if time.monotonic() < self._list_cache_expiry:
+            return self._list_cache_by_name
+        return self._refresh_list_cache()
+
     def _resolve_or_create_list(self, name: str) -> str:
         normalized = name.strip().lower()
         if not normalized:
             return self._get_fallback_list_id()
 
-        # Lookup cache, then refresh if miss
-        list_id = self._list_cache_by_name.get(normalized)
-        if list_id:
-            return list_id
-        mapping = self._refresh_list_cache()
+        # Lookup cache (refreshed from the API only once the TTL has expired)
+        cache_was_fresh = time.monotonic() < self._list_cache_expiry
+        mapping = self._get_cached_mapping()
         if normalized in mapping:
             return mapping[normalized]
 
@@ -122,6 +164,13 @@ class GoogleTaskClient:
             # No reasonable preset match; fall back to default
             return self._get_fallback_list_id()
 
+        # A miss on a cached mapping may just mean the list was created elsewhere since the
+        # last fetch; re-fetch once before counting towards the cap or inserting a duplicate
+        if cache_was_fresh:
+            mapping = self._refresh_list_cache()
+            if normalized in mapping:
+                return mapping[normalized]
+
         # Enforce max list count: if already at cap, fallback to best existing
         total_lists = len(mapping)
         if total_lists >= self._max_lists:
@@ -144,7 +193,7 @@ class GoogleTaskClient:
             # fall through to fallback
         return self._get_fallback_list_id()
 
-    def _pick_closest_name(self, candidate: str, options: Set[str]) -> Optional[str]:
+    def _pick_closest_name(self, candidate: str, options: FrozenSet[str]) -> Optional[str]:
         """Pick the closest name from options using simple heuristics."""
         if not options:
             return None
@@ -155,6 +204,10 @@ class GoogleTaskClient:
         for opt in options:
             if candidate in opt or opt in candidate:
                 return opt
+        # Edit-distance similarity in C when rapidfuzz is installed
+        if _rf_process is not None:
+            match = _rf_process.extractOne(candidate, sorted(options), scorer=_rf_fuzz.ratio)
+            return match[0] if match else None
         # Small Levenshtein-like heuristic (length diff and common prefix)
         best = None
         best_score = -1
@@ -174,7 +227,11 @@ class GoogleTaskClient:
     def _ensure_preset_lists(self) -> None:
         if not self._preset_names:
             return
-        mapping = self._refresh_list_cache()
+        cache_was_fresh = time.monotonic() < self._list_cache_expiry
+        mapping = self._get_cached_mapping()
+        if cache_was_fresh and not self._preset_names.issubset(mapping):
+            # Only re-fetch when a preset looks missing, so lists created elsewhere are not duplicated
+            mapping = self._refresh_list_cache()
         for preset in self._preset_names:
             if preset in mapping:
                 continue
@@ -191,10 +248,10 @@ class GoogleTaskClient:
                 self.logger.warning("Unable to create preset task list '%s': %s", preset, exc)
 
     def _pick_similar_list(self, normalized: str, mapping: Dict[str, str]) -> Optional[str]:
-        # Exact match already handled; try simple heuristics among existing lists
-        for existing_name, list_id in mapping.items():
-            if existing_name == normalized:
-                return list_id
+        # Exact match is a dict lookup; otherwise try simple heuristics among existing lists
+        list_id = mapping.get(normalized)
+        if list_id:
+            return list_id
         # Prefix/suffix containment
         for existing_name, list_id in mapping.items():
             if normalized in existing_name or existing_name in normalized:
@@ -217,49 +274,66 @@ class GoogleTaskClient:
             target_tz = ZoneInfo("UTC")
         try:
             # Compute [start,end) window in UTC for the given local date
-            year, month, day = [int(x) for x in local_date_str.split("-")]
-            start_local = datetime(year, month, day, 0, 0, 0, tzinfo=target_tz)
-            end_local = start_local.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+            local_date = date.fromisoformat(local_date_str)
+            start_local = datetime(local_date.year, local_date.month, local_date.day, tzinfo=target_tz)
+            end_local = start_local + timedelta(days=1)
             due_min = start_local.astimezone(timezone.utc).isoformat()
             due_max = end_local.astimezone(timezone.utc).isoformat()
 
             mapping = self._refresh_list_cache()
             # Scan ALL lists to avoid missing tasks created into non-preset lists
-            target_list_ids: List[str] = list(mapping.values())
-            for list_id in target_list_ids:
-                page_token = None
-                while True:
-                    resp = (
-                        self.service.tasks()
-                        .list(
-                            tasklist=list_id,
-                            showCompleted=False,
-                            showDeleted=False,
-                            maxResults=100,
-                            dueMin=due_min,
-                            dueMax=due_max,
-                            pageToken=page_token,
-                        )
-                        .execute()
-                    )
-                    for item in resp.get("items", []) or []:
-                        # Status double-check and annotate list id
-                        if item.get("status") == "completed":
-                            continue
-                        item["_list_id"] = list_id
-                        tasks.append(item)
-                    page_token = resp.get("nextPageToken")
-                    if not page_token:
-                        break
+            tasks = self._scan_lists(list(mapping.values()), due_min, due_max)
         except HttpError as exc:
             self.logger.exception("Google Tasks API list error: %s", exc)
             # return what we have
         return tasks
 
+    def _scan_lists(self, list_ids: List[str], due_min: str, due_max: str) -> list:
+        """Fetch open tasks due in [due_min, due_max) from several lists.
+
+        All lists are queried in one batch HTTP call; lists with more pages are re-batched
+        until exhausted. Results keep the order of list_ids.
+        """
+        found: Dict[str, list] = {list_id: [] for list_id in list_ids}
+        list_kwargs = dict(
+            showCompleted=False, showDeleted=False, maxResults=100, dueMin=due_min, dueMax=due_max
+        )
+        pending: List[Tuple[str, Optional[str]]] = [(list_id, None) for list_id in list_ids]
+        while pending:
+            next_pending: List[Tuple[str, Optional[str]]] = []
+            for offset in range(0, len(pending), BATCH_MAX_REQUESTS):
+                chunk = pending[offset : offset + BATCH_MAX_REQUESTS]
+
+                def _on_response(request_id, response, exception, chunk=chunk):
+                    list_id = chunk[int(request_id)][0]
+                    if exception is not None:
+                        self.logger.warning("Google Tasks API list error for list %s: %s", list_id, exception)
+                        return
+                    for item in response.get("items", []) or []:
+                        # Status double-check and annotate list id
+                        if item.get("status") == "completed":
+                            continue
+                        item["_list_id"] = list_id
+                        found[list_id].append(item)
+                    page_token = response.get("nextPageToken")
+                    if page_token:
+                        next_pending.append((list_id, page_token))
+
+                batch = self.service.new_batch_http_request(callback=_on_response)
+                tasks_api = self.service.tasks()
+                for idx, (list_id, page_token) in enumerate(chunk):
+                    batch.add(
+                        tasks_api.list(tasklist=list_id, pageToken=page_token, **list_kwargs),
+                        request_id=str(idx),
+                    )
+                batch.execute()
+            pending = next_pending
+        return [item for list_id in list_ids for item in found[list_id]]
+
     def _extract_list_id(self, created: dict) -> str:
-        self_link = created.get("selfLink") or ""
-        if "/lists/" in self_link and "/tasks/" in self_link:
-            return self_link.split("/lists/")[1].split("/tasks/", 1)[0]
+        match = _LIST_ID_RE.search(created.get("selfLink") or "")
+        if match:
+            return match.group(1)
         parent = created.get("parent")
         if parent:
             return parent
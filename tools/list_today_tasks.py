@@ -1,12 +1,19 @@
 from __future__ import annotations
 import json
 import os
+from dataclasses import asdict, dataclass
 from datetime import datetime, timezone
+from typing import Optional
 from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 import sys
 from pathlib import Path
 from googleapiclient.discovery import build
 
+try:
+    import orjson  # optional, faster JSON dump for the report
+except ImportError:
+    orjson = None
+
 # Ensure project root is on sys.path to import smart_assistant
 PROJECT_ROOT = Path(__file__).resolve().parents[1]
 if str(PROJECT_ROOT) not in sys.path:
@@ -14,7 +21,18 @@ if str(PROJECT_ROOT) not in sys.path:
 
 from smart_assistant.config import load_config, get_config_value
 from smart_assistant.calendar_client import GoogleCalendarClient
-from smart_assistant.task_client import GoogleTaskClient
+from smart_assistant.task_client import BATCH_MAX_REQUESTS, GoogleTaskClient
+
+
+@dataclass(slots=True)
+class TaskRow:
+    """One uncompleted task found while scanning the lists."""
+    title: str
+    due: Optional[str]
+    status: str
+    list: str
+    list_id: str
+    task_id: Optional[str]
 
 
 def main() -> None:
@@ -61,7 +79,8 @@ def main() -> None:
     print()
 
     # Build service
-    service = build('tasks', 'v1', credentials=cal.credentials)
+    # Bundled (static) discovery doc, no legacy file cache; one AuthorizedHttp keeps the connection alive
+    service = build('tasks', 'v1', credentials=cal.credentials, static_discovery=True, cache_discovery=False)
     
     # Get all task lists
     tasklists = service.tasklists().list().execute()
@@ -72,7 +91,31 @@ def main() -> None:
         print(f"  - {tl['title']:<30} (id: {tl['id']})")
     print()
 
-    # Scan each list
+    # Fetch every list's tasks in batch HTTP requests (one round trip per BATCH_MAX_REQUESTS lists)
+    results = {}
+
+    def on_tasks(request_id, response, exception):
+        if exception is not None:
+            print(f"  ! failed to list tasks for {request_id}: {exception}")
+            return
+        results[request_id] = response
+
+    for offset in range(0, len(all_lists), BATCH_MAX_REQUESTS):
+        batch = service.new_batch_http_request(callback=on_tasks)
+        for task_list in all_lists[offset:offset + BATCH_MAX_REQUESTS]:
+            batch.add(
+                service.tasks().list(
+                    tasklist=task_list['id'],
+                    showCompleted=False,  # 只显示未完成的
+                    showHidden=False
+                ),
+                request_id=task_list['id'],
+            )
+        batch.execute()
+
+    # Scan each list; the report is buffered and written once instead of one print per line
+    report: list[str] = []
+    emit = report.append
     all_today_tasks = []
     all_no_due_tasks = []
     
@@ -80,18 +123,14 @@ def main() -> None:
         list_id = task_list['id']
         list_title = task_list['title']
         
-        print("=" * 80)
-        print(f"LIST: {list_title}")
-        print("=" * 80)
+        emit("=" * 80)
+        emit(f"LIST: {list_title}")
+        emit("=" * 80)
         
-        result = service.tasks().list(
-            tasklist=list_id,
-            showCompleted=False,  # 只显示未完成的
-            showHidden=False
-        ).execute()
+        result = results.get(list_id) or {}
         
         items = result.get('items', [])
-        print(f"Total uncompleted tasks: {len(items)}")
+        emit(f"Total uncompleted tasks: {len(items)}")
         
         if items:
             for i, item in enumerate(items, start=1):
@@ -99,53 +138,45 @@ def main() -> None:
                 due = item.get('due')
                 status = item.get('status', 'unknown')
                 
-                print(f"  {i}. [{status}] {title}")
+                emit(f"  {i}. [{status}] {title}")
                 
                 if due:
-                    # Parse date
-                    task_date = due.split('T')[0]
-                    print(f"     due: {task_date}", end="")
-                    
+                    # RFC 3339 due values always start with the YYYY-MM-DD date
+                    task_date = due[:10]
                     if task_date == local_date_str:
-                        print(" ← TODAY! ✓")
-                        all_today_tasks.append({
-                            'title': title,
-                            'due': task_date,
-                            'status': status,
-                            'list': list_title,
-                            'list_id': list_id,
-                            'task_id': item.get('id')
-                        })
+                        emit(f"     due: {task_date} ← TODAY! ✓")
+                        all_today_tasks.append(
+                            TaskRow(title, task_date, status, list_title, list_id, item.get('id'))
+                        )
                     else:
-                        print()
+                        emit(f"     due: {task_date}")
                 else:
-                    print(f"     due: NO DUE DATE")
-                    all_no_due_tasks.append({
-                        'title': title,
-                        'status': status,
-                        'list': list_title,
-                        'list_id': list_id,
-                        'task_id': item.get('id')
-                    })
-        print()
+                    emit(f"     due: NO DUE DATE")
+                    all_no_due_tasks.append(TaskRow(title, None, status, list_title, list_id, item.get('id')))
+        emit("")
 
     # Summary
-    print("=" * 80)
-    print("SUMMARY")
-    print("=" * 80)
-    print(f"\n📅 Tasks with due date = TODAY ({local_date_str}): {len(all_today_tasks)}")
+    emit("=" * 80)
+    emit("SUMMARY")
+    emit("=" * 80)
+    emit(f"\n📅 Tasks with due date = TODAY ({local_date_str}): {len(all_today_tasks)}")
     for i, task in enumerate(all_today_tasks, start=1):
-        print(f"  {i}. [{task['list']}] {task['title']}")
+        emit(f"  {i}. [{task.list}] {task.title}")
     
-    print(f"\n⏰ Tasks with NO due date: {len(all_no_due_tasks)}")
+    emit(f"\n⏰ Tasks with NO due date: {len(all_no_due_tasks)}")
     for i, task in enumerate(all_no_due_tasks, start=1):
-        print(f"  {i}. [{task['list']}] {task['title']}")
+        emit(f"  {i}. [{task.list}] {task.title}")
     
     # JSON output
-    print("\n" + "=" * 80)
-    print("JSON OUTPUT (tasks for today)")
-    print("=" * 80)
-    print(json.dumps(all_today_tasks, ensure_ascii=False, indent=2))
+    emit("\n" + "=" * 80)
+    emit("JSON OUTPUT (tasks for today)")
+    emit("=" * 80)
+    if orjson is not None:
+        # orjson serializes slotted dataclasses natively and emits UTF-8 directly
+        emit(orjson.dumps(all_today_tasks, option=orjson.OPT_INDENT_2).decode("utf-8"))
+    else:
+        emit(json.dumps([asdict(task) for task in all_today_tasks], ensure_ascii=False, indent=2))
+    sys.stdout.write("\n".join(report) + "\n")
 
 
 if __name__ == "__main__":
@@ -4,22 +4,60 @@
 测试GPT返回的颜色值、类别映射和最终颜色ID
 """
 
+import io
 import json
 import sys
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
 from datetime import datetime, timedelta
+from functools import lru_cache, partial
 from zoneinfo import ZoneInfo
 
 # 添加项目路径
 sys.path.insert(0, '/home/jerry/Documents/telegram_bot')
 
+# -v / --verbose 时才打印完整的模拟 JSON
+VERBOSE = "-v" in sys.argv or "--verbose" in sys.argv
+
 from smart_assistant.openai_parser import OpenAIEventParser
 from smart_assistant.assistant import CalendarAutomationAssistant, DEFAULT_CATEGORY_COLORS
 from smart_assistant.colors import normalize_color_hint
 from smart_assistant.models import CalendarEvent
 
 
+def parse_all(parser, texts):
+    """并发调用 parse_text（每个输入一次独立的 API 请求），按输入顺序返回 (parsed, error)"""
+    def parse_one(text):
+        try:
+            return parser.parse_text(text), None
+        except Exception as e:
+            return None, e
+
+    with ThreadPoolExecutor(max_workers=min(8, len(texts) or 1)) as pool:
+        return list(pool.map(parse_one, texts))
+
+
+def run_concurrently(tests):
+    """并发运行互不依赖的联网测试；每个测试写入自己的缓冲区，全部结束后按原顺序打印"""
+    def run(test):
+        buf = io.StringIO()
+        try:
+            test(out=buf)
+            return buf.getvalue(), None
+        except Exception as e:
+            return buf.getvalue(), e
+
+    with ThreadPoolExecutor(max_workers=len(tests)) as pool:
+        outcomes = list(pool.map(run, tests))
+    for output, error in outcomes:
+        sys.stdout.write(output)
+        if error is not None:
+            raise error
+
+
+@lru_cache(maxsize=1)
 def load_config():
-    """加载配置文件"""
+    """加载配置文件（每个进程只解析一次，各测试只读使用）"""
     import yaml
     with open('/home/jerry/Documents/telegram_bot/config.yaml', 'r', encoding='utf-8') as f:
         return yaml.safe_load(f)
@@ -128,9 +166,20 @@ def test_gpt_response_parsing():
         text_model=config['openai']['text_model'],
     )
     
+    # 创建临时assistant来测试颜色应用（所有事件共用一个）
+    category_colors = config.get('google', {}).get('category_colors')
+    default_color_id = config.get('google', {}).get('default_color_id', '')
+    temp_assistant = CalendarAutomationAssistant(
+        parser=parser,
+        calendar_client=None,
+        category_colors=category_colors,
+        default_color_id=default_color_id if default_color_id else None,
+    )
+    
     for i, mock_payload in enumerate(mock_responses, 1):
         print(f"\n模拟响应 {i}:")
-        print(json.dumps(mock_payload, indent=2, ensure_ascii=False))
+        if VERBOSE:
+            print(json.dumps(mock_payload, indent=2, ensure_ascii=False))
         
         try:
             event = parser._dict_to_event(mock_payload)
@@ -140,17 +189,6 @@ def test_gpt_response_parsing():
             print(f"    颜色ID: {repr(event.color_id)}")
             
             # 应用类别颜色
-            category_colors = config.get('google', {}).get('category_colors')
-            default_color_id = config.get('google', {}).get('default_color_id', '')
-            
-            from smart_assistant.assistant import CalendarAutomationAssistant
-            # 创建临时assistant来测试颜色应用
-            temp_assistant = CalendarAutomationAssistant(
-                parser=parser,
-                calendar_client=None,
-                category_colors=category_colors,
-                default_color_id=default_color_id if default_color_id else None,
-            )
             temp_assistant._apply_category_color(event)
             print(f"    应用类别颜色后: {repr(event.color_id)}")
         except Exception as e:
@@ -159,11 +197,12 @@ def test_gpt_response_parsing():
     print()
 
 
-def test_real_gpt_call():
+def test_real_gpt_call(out=sys.stdout):
     """测试真实的GPT调用"""
-    print("=" * 60)
-    print("测试4: 真实GPT调用")
-    print("=" * 60)
+    emit = partial(print, file=out)
+    emit("=" * 60)
+    emit("测试4: 真实GPT调用")
+    emit("=" * 60)
     
     config = load_config()
     
@@ -185,97 +224,100 @@ def test_real_gpt_call():
     )
     
     # 保存原始方法以便查看原始响应
-    original_run_completion = parser._run_completion
-    captured_responses = []
+    original_request_completion = parser._request_completion
+    # 按输入文本保存（各输入并发请求，完成顺序不固定）
+    captured_responses = {}
     
-    def debug_run_completion(model, user_content):
-        result = original_run_completion(model, user_content)
+    def debug_request_completion(model, system_prompt, user_content):
+        result = original_request_completion(model, system_prompt, user_content)
         # 保存GPT返回的原始payload
         if isinstance(result, dict):
-            captured_responses.append({
+            captured_responses[user_content[0]["text"]] = {
                 'color': result.get('color'),
                 'color_id': result.get('color_id'),
                 'colorId': result.get('colorId'),
                 'category': result.get('category'),
-            })
+            }
         return result
     
+    # 创建临时assistant来测试颜色应用（所有输入共用一个）
+    category_colors = config.get('google', {}).get('category_colors')
+    default_color_id = config.get('google', {}).get('default_color_id', '')
+    temp_assistant = CalendarAutomationAssistant(
+        parser=parser,
+        calendar_client=None,
+        category_colors=category_colors,
+        default_color_id=default_color_id if default_color_id else None,
+    )
+    
     # 临时替换方法
-    parser._run_completion = debug_run_completion
+    parser._request_completion = debug_request_completion
+    outcomes = parse_all(parser, test_inputs)
     
     for i, test_input in enumerate(test_inputs):
-        print(f"\n输入 {i+1}: {test_input}")
+        emit(f"\n输入 {i+1}: {test_input}")
         try:
-            parsed = parser.parse_text(test_input)
+            parsed, error = outcomes[i]
+            if error is not None:
+                raise error
             
             # 显示捕获的响应
-            if i < len(captured_responses):
-                resp = captured_responses[i]
-                print(f"  GPT返回的color字段: {repr(resp.get('color_field'))}")
-                print(f"  GPT返回的category字段: {repr(resp.get('category'))}")
-            print(f"  解析结果:")
-            print(f"    事件数: {len(parsed.events)}")
-            print(f"    任务数: {len(parsed.tasks)}")
+            resp = captured_responses.get(test_input.strip())
+            if resp is not None:
+                emit(f"  GPT返回的color字段: {repr(resp.get('color_field'))}")
+                emit(f"  GPT返回的category字段: {repr(resp.get('category'))}")
+            emit(f"  解析结果:")
+            emit(f"    事件数: {len(parsed.events)}")
+            emit(f"    任务数: {len(parsed.tasks)}")
             
             for event in parsed.events:
-                print(f"\n  事件详情:")
-                print(f"    标题: {event.title}")
-                print(f"    类别: {repr(event.category)}")
-                print(f"    颜色ID: {repr(event.color_id)}")
+                emit(f"\n  事件详情:")
+                emit(f"    标题: {event.title}")
+                emit(f"    类别: {repr(event.category)}")
+                emit(f"    颜色ID: {repr(event.color_id)}")
                 
                 # 应用类别颜色
-                category_colors = config.get('google', {}).get('category_colors')
-                default_color_id = config.get('google', {}).get('default_color_id', '')
-                
-                from smart_assistant.assistant import CalendarAutomationAssistant
-                temp_assistant = CalendarAutomationAssistant(
-                    parser=parser,
-                    calendar_client=None,
-                    category_colors=category_colors,
-                    default_color_id=default_color_id if default_color_id else None,
-                )
-                
                 color_before = event.color_id
                 temp_assistant._apply_category_color(event)
                 color_after = event.color_id
                 
-                print(f"    应用类别颜色前: {repr(color_before)}")
-                print(f"    应用类别颜色后: {repr(color_after)}")
+                emit(f"    应用类别颜色前: {repr(color_before)}")
+                emit(f"    应用类别颜色后: {repr(color_after)}")
                 
                 # 检查是否是蓝色
                 if color_after == "9":
-                    print(f"    ⚠️  警告: 最终颜色是蓝色 (9)")
+                    emit(f"    ⚠️  警告: 最终颜色是蓝色 (9)")
                     if color_before == "9":
-                        print(f"    ⚠️  问题: GPT返回了蓝色，或者类别映射到了蓝色")
+                        emit(f"    ⚠️  问题: GPT返回了蓝色，或者类别映射到了蓝色")
                     elif event.category == "travel":
-                        print(f"    ℹ️  信息: 因为类别是'travel'，所以映射到蓝色(9)")
+                        emit(f"    ℹ️  信息: 因为类别是'travel'，所以映射到蓝色(9)")
                     else:
-                        print(f"    ⚠️  问题: 类别'{event.category}'不应该映射到蓝色")
+                        emit(f"    ⚠️  问题: 类别'{event.category}'不应该映射到蓝色")
                 elif color_after:
-                    print(f"    ✓ 最终颜色: {color_after}")
+                    emit(f"    ✓ 最终颜色: {color_after}")
                 else:
-                    print(f"    ⚠️  警告: 没有设置颜色")
+                    emit(f"    ⚠️  警告: 没有设置颜色")
                     
         except Exception as e:
-            print(f"  错误: {e}")
+            emit(f"  错误: {e}")
             import traceback
-            traceback.print_exc()
+            traceback.print_exc(file=out)
     
     # 恢复原始方法
-    parser._run_completion = original_run_completion
+    parser._request_completion = original_request_completion
     
     # 总结
-    print("\n" + "=" * 60)
-    print("总结: GPT返回的color字段统计")
-    print("=" * 60)
-    blue_count = sum(1 for r in captured_responses if r.get('color_field') in ('blue', '9', 'blueberry'))
+    emit("\n" + "=" * 60)
+    emit("总结: GPT返回的color字段统计")
+    emit("=" * 60)
+    blue_count = sum(1 for r in captured_responses.values() if r.get('color_field') in ('blue', '9', 'blueberry'))
     total_count = len(captured_responses)
     if blue_count > 0:
-        print(f"⚠️  发现 {blue_count}/{total_count} 个响应包含蓝色相关的color字段")
-        print("   这可能是问题所在：GPT在用户没有明确指定颜色时也返回了'blue'")
+        emit(f"⚠️  发现 {blue_count}/{total_count} 个响应包含蓝色相关的color字段")
+        emit("   这可能是问题所在：GPT在用户没有明确指定颜色时也返回了'blue'")
     else:
-        print(f"✓ 没有发现GPT自动返回蓝色")
-    print()
+        emit(f"✓ 没有发现GPT自动返回蓝色")
+    emit()
 
 
 def test_default_color_id_handling():
@@ -284,11 +326,6 @@ def test_default_color_id_handling():
     print("测试5: default_color_id处理")
     print("=" * 60)
     
-    from smart_assistant.assistant import CalendarAutomationAssistant
-    from smart_assistant.openai_parser import OpenAIEventParser
-    from smart_assistant.models import CalendarEvent
-    from datetime import datetime
-    
     config = load_config()
     
     # 测试空字符串default_color_id
@@ -304,6 +341,16 @@ def test_default_color_id_handling():
         default_timezone=config['assistant']['default_tz'],
     )
     
+    # 事件模板只建一次，每个用例用 replace() 得到独立副本（时间也保持一致）
+    now = datetime.now()
+    event_template = CalendarEvent(
+        title="测试事件",
+        start=now,
+        end=now,
+        timezone="UTC",
+        category="unknown_category",  # 不在category_colors中
+    )
+    
     for default_color_id, expected_normalized, description in test_cases:
         assistant = CalendarAutomationAssistant(
             parser=parser,
@@ -317,13 +364,7 @@ def test_default_color_id_handling():
         print(f"   输入: {repr(default_color_id)} -> 归一化后: {repr(normalized)} (期望: {repr(expected_normalized)})")
         
         # 测试应用到事件
-        event = CalendarEvent(
-            title="测试事件",
-            start=datetime.now(),
-            end=datetime.now(),
-            timezone="UTC",
-            category="unknown_category",  # 不在category_colors中
-        )
+        event = replace(event_template)
         assistant._apply_category_color(event)
         print(f"   应用到事件后color_id: {repr(event.color_id)}")
         if default_color_id == "" and event.color_id == "9":
@@ -370,11 +411,12 @@ def test_category_normalization():
     print()
 
 
-def test_final_event_payload():
+def test_final_event_payload(out=sys.stdout):
     """测试最终发送到Google Calendar的事件payload"""
-    print("=" * 60)
-    print("测试7: 最终事件payload（模拟完整流程）")
-    print("=" * 60)
+    emit = partial(print, file=out)
+    emit("=" * 60)
+    emit("测试7: 最终事件payload（模拟完整流程）")
+    emit("=" * 60)
     
     config = load_config()
     
@@ -391,7 +433,6 @@ def test_final_event_payload():
     
     default_color_id = config.get('google', {}).get('default_color_id', '')
     
-    from smart_assistant.assistant import CalendarAutomationAssistant
     assistant = CalendarAutomationAssistant(
         parser=parser,
         calendar_client=None,
@@ -406,45 +447,47 @@ def test_final_event_payload():
         ("下周一上午9点看医生", "medical"),  # 应该映射到medical
     ]
     
-    for test_input, expected_category in test_cases:
-        print(f"\n测试输入: {test_input}")
+    outcomes = parse_all(assistant.parser, [test_input for test_input, _ in test_cases])
+    for (test_input, expected_category), (parsed, error) in zip(test_cases, outcomes):
+        emit(f"\n测试输入: {test_input}")
         try:
-            parsed = assistant.parser.parse_text(test_input)
+            if error is not None:
+                raise error
             if parsed.events:
                 event = parsed.events[0]
-                print(f"  解析后 - 类别: {repr(event.category)}, 颜色ID: {repr(event.color_id)}")
+                emit(f"  解析后 - 类别: {repr(event.category)}, 颜色ID: {repr(event.color_id)}")
                 
                 # 验证类别在允许列表中
                 if allowed_categories and event.category not in allowed_categories:
-                    print(f"  ⚠️  警告: 类别'{event.category}'不在允许列表中!")
+                    emit(f"  ⚠️  警告: 类别'{event.category}'不在允许列表中!")
                 else:
-                    print(f"  ✓ 类别'{event.category}'在允许列表中")
+                    emit(f"  ✓ 类别'{event.category}'在允许列表中")
                 
                 # 应用类别颜色（这是实际流程中会调用的）
                 assistant._apply_category_color(event)
-                print(f"  应用类别颜色后 - 颜色ID: {repr(event.color_id)}")
+                emit(f"  应用类别颜色后 - 颜色ID: {repr(event.color_id)}")
                 
                 # 转换为Google Calendar payload
                 payload = event.to_google_body()
                 color_id_in_payload = payload.get('colorId')
-                print(f"  最终payload中的colorId: {repr(color_id_in_payload)}")
+                emit(f"  最终payload中的colorId: {repr(color_id_in_payload)}")
                 
                 if color_id_in_payload == "9":
-                    print(f"  ⚠️  警告: 最终payload中的colorId是'9'（蓝色）")
+                    emit(f"  ⚠️  警告: 最终payload中的colorId是'9'（蓝色）")
                     if event.category == "travel":
-                        print(f"     (这是正常的，因为'travel'类别映射到蓝色)")
+                        emit(f"     (这是正常的，因为'travel'类别映射到蓝色)")
                     else:
-                        print(f"     (这可能不正常，类别'{event.category}'不应该映射到蓝色)")
+                        emit(f"     (这可能不正常，类别'{event.category}'不应该映射到蓝色)")
                 elif color_id_in_payload:
-                    print(f"  ✓ 最终颜色: {color_id_in_payload}")
+                    emit(f"  ✓ 最终颜色: {color_id_in_payload}")
                 else:
-                    print(f"  ℹ️  没有设置颜色（Google Calendar将使用默认颜色）")
+                    emit(f"  ℹ️  没有设置颜色（Google Calendar将使用默认颜色）")
         except Exception as e:
-            print(f"  错误: {e}")
+            emit(f"  错误: {e}")
             import traceback
-            traceback.print_exc()
+            traceback.print_exc(file=out)
     
-    print()
+    emit()
 
 
 def main():
@@ -469,12 +512,9 @@ def main():
         # 测试6: 类别归一化功能
         test_category_normalization()
         
-        # 测试7: 最终事件payload
-        test_final_event_payload()
-        
-        # 测试4: 真实GPT调用
-        # 自动运行测试
-        test_real_gpt_call()
+        # 测试7: 最终事件payload / 测试4: 真实GPT调用
+        # 两者都要真实调用 API 且互不依赖，并发运行，输出仍按 7 → 4 的顺序打印
+        run_concurrently([test_final_event_payload, test_real_gpt_call])
         
         print("\n" + "=" * 60)
         print("测试完成")
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+独立测试脚本：检查邮件摘要 FETCH（头部 + BODYSTRUCTURE）的解析与正文选择
+不连接真实 IMAP 服务器，用伪造的 fetch 响应驱动 EmailEventIngestor
+"""
+
+import sys
+
+# 添加项目路径
+sys.path.insert(0, '/home/jerry/Documents/telegram_bot')
+
+from smart_assistant.email_ingestor import EmailEventIngestor
+
+HEADERS = b"Subject: Weekly digest\r\nFrom: news@example.com\r\nTo: bot@example.com\r\n\r\n"
+HTML_BODY = b"<p>Meetup on Friday 7pm</p>"
+
+
+class FakeMailbox:
+    """按 FETCH 的数据项返回预置的 imaplib 风格响应"""
+
+    def __init__(self, responses):
+        self.responses = responses
+        self.requests = []
+
+    def fetch(self, message_set, parts):
+        self.requests.append((message_set, parts))
+        return "OK", self.responses[parts]
+
+
+def make_ingestor():
+    return EmailEventIngestor(host="imap.example.com", username="bot", password="", assistant=None)
+
+
+def test_html_only_message():
+    """单部分 text/html 邮件应取回第 1 部分作为正文，而不是空字符串"""
+    structure = b' BODYSTRUCTURE ("text" "html" ("charset" "utf-8") NIL NIL "7bit" 27 1 NIL NIL NIL NIL))'
+    mailbox = FakeMailbox({
+        "(BODY.PEEK[HEADER.FIELDS (SUBJECT FROM TO)] BODYSTRUCTURE)": [
+            (b"1 (BODY[HEADER.FIELDS (SUBJECT FROM TO)] {%d}" % len(HEADERS), HEADERS),
+            structure,
+        ],
+        "(BODY.PEEK[1])": [(b"1 (BODY[1] {%d}" % len(HTML_BODY), HTML_BODY), b")"],
+    })
+    ingestor = make_ingestor()
+    summaries = ingestor._fetch_summaries(mailbox, ["1"])
+    headers, part, parsed = summaries["1"]
+    assert parsed and part == ("1", "utf-8", "7bit"), summaries
+    assert headers["Subject"] == "Weekly digest"
+    bodies = ingestor._fetch_text_bodies(mailbox, summaries)
+    assert bodies["1"] == HTML_BODY.decode(), bodies
+
+
+def test_non_text_single_part_falls_back():
+    """单部分非文本邮件交给完整拉取 + _extract_body 处理"""
+    structure = b' BODYSTRUCTURE ("application" "pdf" NIL NIL NIL "base64" 1024 NIL NIL NIL NIL))'
+    mailbox = FakeMailbox({
+        "(BODY.PEEK[HEADER.FIELDS (SUBJECT FROM TO)] BODYSTRUCTURE)": [
+            (b"1 (BODY[HEADER.FIELDS (SUBJECT FROM TO)] {%d}" % len(HEADERS), HEADERS),
+            structure,
+        ],
+    })
+    ingestor = make_ingestor()
+    summaries = ingestor._fetch_summaries(mailbox, ["1"])
+    assert summaries["1"][1:] == (None, False), summaries
+    assert "1" not in ingestor._fetch_text_bodies(mailbox, summaries)
+
+
+def test_bodystructure_literal_before_headers():
+    """BODYSTRUCTURE 先返回且自带 literal 时，头部仍按 HEADER.FIELDS 前缀识别"""
+    filename = b'report "Q3".pdf'
+    mailbox = FakeMailbox({
+        "(BODY.PEEK[HEADER.FIELDS (SUBJECT FROM TO)] BODYSTRUCTURE)": [
+            (
+                b'1 (BODYSTRUCTURE (("text" "plain" ("charset" "utf-8") NIL NIL "7bit" 10 1 NIL NIL NIL NIL)'
+                b'("application" "pdf" ("name" {%d}' % len(filename),
+                filename,
+            ),
+            (
+                b') NIL NIL "base64" 2048 NIL ("attachment" NIL) NIL NIL) "mixed" NIL NIL NIL)'
+                b" BODY[HEADER.FIELDS (SUBJECT FROM TO)] {%d}" % len(HEADERS),
+                HEADERS,
+            ),
+            b")",
+        ],
+    })
+    ingestor = make_ingestor()
+    headers, part, parsed = ingestor._fetch_summaries(mailbox, ["1"])["1"]
+    assert headers["Subject"] == "Weekly digest", headers.items()
+    assert headers["From"] == "news@example.com"
+    # 结构中的 literal 无法解析，正文走完整拉取回退
+    assert part is None and not parsed
+
+
+def main():
+    tests = [test_html_only_message, test_non_text_single_part_falls_back, test_bodystructure_literal_before_headers]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✓ {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"✗ {test.__name__}: {e}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()